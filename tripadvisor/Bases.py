@@ -1,10 +1,9 @@
-from datetime import datetime
-
-from sqlalchemy import Column, Integer, String, Date, Numeric
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, UniqueConstraint
 
 from psql import Psql
 
-SCHEMA = 'scrape_' + datetime.now().strftime('%d%m%Y_%H%M')
+# vast schema; runs worden via upsert (Psql.upsert) samengevoegd in plaats van per run een nieuw schema
+SCHEMA = 'tripadvisor'
 Base = Psql(SCHEMA).set_dec_base(echo=False)
 
 
@@ -12,6 +11,7 @@ class Categorie(Base):
     """Create class for table, load columns via declarative base."""
 
     __tablename__ = 'Categories'
+    __table_args__ = (UniqueConstraint('cat_url'),)
 
     index = Column(Integer, primary_key=True, autoincrement=True)
     status = Column(String(10))
@@ -33,6 +33,7 @@ class Activity(Base):
     """Create class for table, load columns via declarative base."""
 
     __tablename__ = 'Activities'
+    __table_args__ = (UniqueConstraint('attrac_url', 'cat_url'),)
 
     index = Column(Integer, primary_key=True, autoincrement=True)
     status = Column(String(10))
@@ -56,6 +57,7 @@ class Attractie(Base):
     """Create class for table, load columns via declarative base."""
 
     __tablename__ = 'Attracties'
+    __table_args__ = (UniqueConstraint('attrac_url'),)
 
     index = Column(Integer, primary_key=True, autoincrement=True)
     tripadvisor_id = Column(Integer)
@@ -77,6 +79,7 @@ class Attractie(Base):
     pct_poor = Column(Integer)
     pct_terrible = Column(Integer)
     attrac_url = Column(String(200))
+    bijgewerkt = Column(DateTime())
 
     def __init__(self,
                  status,
@@ -120,5 +123,33 @@ class Attractie(Base):
         self.pct_terrible = pct_terr
 
 
-Base.metadata.drop_all(checkfirst=True)
+class AttractieHistorie(Base):
+    """Vorige versie van een attractie, vastgelegd bij elke wijziging."""
+
+    __tablename__ = 'AttractiesHistorie'
+
+    index = Column(Integer, primary_key=True, autoincrement=True)
+    tripadvisor_id = Column(Integer)
+    titel = Column(String(100))
+    status = Column(String(25))
+    adres = Column(String(100))
+    pc_stad = Column(String(100))
+    postcode = Column(String(10))
+    plaats = Column(String(100))
+    land = Column(String(100))
+    lat = Column(Numeric())
+    lon = Column(Numeric())
+    telefoon = Column(String(20))
+    beoordeling = Column(Numeric())
+    aantal_reviews = Column(Integer)
+    pct_excellent = Column(Integer)
+    pct_verygood = Column(Integer)
+    pct_average = Column(Integer)
+    pct_poor = Column(Integer)
+    pct_terrible = Column(Integer)
+    attrac_url = Column(String(200))
+    bijgewerkt = Column(DateTime())
+    gewijzigd = Column(DateTime())
+
+
 Base.metadata.create_all(checkfirst=True)
@@ -0,0 +1,138 @@
+"""
+End-to-end benchmark: de volledige main.py flow tegen opgenomen pagina's (fixtures.py).
+
+Start een FixtureServer, draait main.py --scrape als subproces met TRIPADVISOR_BASE_URL
+naar die server en meet pagina's per seconde, tijd per stap en piek RSS (python, chromedriver
+en chrome samen). Er gaat geen verkeer naar tripadvisor.com, dus runs zijn vergelijkbaar.
+
+Gebruik:
+    python -m tripadvisor.bench_e2e --fixtures <map> [--port 8765] [--repeat 1] [-- <opties voor main.py>]
+
+    bijv. python -m tripadvisor.bench_e2e --fixtures fixtures/nh -- --tabs 4 --provincies Noord-Holland
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import psutil
+
+from tripadvisor.fixtures import PORT, FixtureServer
+
+SAMPLE_EVERY = 0.25
+
+
+def tree_rss_mb(proc: psutil.Process) -> float:
+    """RSS van een proces en al zijn kinderen in MB (0 als het proces al weg is)."""
+    try:
+        procs = [proc] + proc.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0.0
+
+    total = 0
+    for p in procs:
+        try:
+            total += p.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+
+    return total / 2 ** 20
+
+
+def read_metrics(path: str) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """Opgetelde timings en tellers uit een metrics JSONL bestand."""
+    timings, counters = {}, {}
+
+    if not os.path.exists(path):
+        return timings, counters
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+
+            if event.get('type') == 'timing':
+                timings[event['name']] = timings.get(event['name'], 0.0) + event['seconds']
+            elif event.get('type') == 'counter':
+                counters[event['name']] = counters.get(event['name'], 0) + event['n']
+
+    return timings, counters
+
+
+def run(fixtures: str, port: int, main_args: List[str]) -> dict:
+    """Eén run van main.py tegen de fixture server, in een lege werkmap."""
+    with FixtureServer(fixtures, port) as server, tempfile.TemporaryDirectory() as work:
+        metrics_file = os.path.join(work, 'metrics.jsonl')
+        env = dict(os.environ, TRIPADVISOR_BASE_URL=server.base_url)
+        env.pop('TRIPADVISOR_RECORD', None)
+
+        # de package moet vanuit de werkmap te importeren zijn
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(p for p in (root, env.get('PYTHONPATH')) if p)
+
+        cmd = [sys.executable, '-m', 'tripadvisor.main', '--scrape', '--headless', '--metrics', metrics_file]
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd + main_args, cwd=work, env=env)
+        watched = psutil.Process(proc.pid)
+        peak = 0.0
+
+        while proc.poll() is None:
+            peak = max(peak, tree_rss_mb(watched))
+            time.sleep(SAMPLE_EVERY)
+
+        wall = time.perf_counter() - start
+        # ook de tellers van shards, die voegt main samen in zijn eigen metrics
+        timings, counters = read_metrics(metrics_file)
+
+        return {
+            'exit_code': proc.returncode,
+            'wall': wall,
+            'served': server.served,
+            'missing': len(server.missing),
+            'pages': counters.get('pages.browser', 0) + counters.get('pages.http', 0),
+            'peak_rss_mb': peak,
+            'stages': {k: v for k, v in timings.items() if k.startswith('stage.')},
+        }
+
+
+def report(result: dict):
+    wall = max(result['wall'], 1e-9)
+
+    print(f"\nexit code:      {result['exit_code']}")
+    print(f"tijd:           {result['wall']:.1f} s")
+    print(f"pagina's:       {result['served']} geserveerd ({result['served'] / wall:.2f}/s), "
+          f"{result['pages']} gelezen ({result['pages'] / wall:.2f}/s)")
+    print(f"niet gevonden:  {result['missing']}")
+    print(f"piek RSS:       {result['peak_rss_mb']:.0f} MB")
+
+    for name, seconds in sorted(result['stages'].items()):
+        print(f'{name:<16}{seconds:>10.1f} s')
+
+
+def main(args: List[str]):
+    if '--fixtures' not in args:
+        print(__doc__)
+        return
+
+    main_args = args[args.index('--') + 1:] if '--' in args else []
+    args = args[:args.index('--')] if '--' in args else args
+
+    fixtures = args[args.index('--fixtures') + 1]
+    port = int(args[args.index('--port') + 1]) if '--port' in args else PORT
+    repeat = int(args[args.index('--repeat') + 1]) if '--repeat' in args else 1
+
+    for i in range(repeat):
+        print(f'run {i + 1}/{repeat}: main.py {" ".join(main_args)}')
+        report(run(fixtures, port, main_args))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,65 @@
+"""
+Benchmark van de parser backends op opgeslagen listing en detail pagina's.
+
+Gebruik:
+    python -m tripadvisor.bench_parser --listing <map> --detail <map> [--repeat 3]
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from tripadvisor.parser import BACKENDS, parse
+from tripadvisor.scrape_2 import get_links
+from tripadvisor.scrape_3 import AttractiePage
+
+
+def read_pages(folder: str) -> List[str]:
+    return [p.read_text(encoding='utf-8') for p in sorted(Path(folder).glob('*.html'))]
+
+
+def parse_listing(html: str, backend: str) -> int:
+    return len(get_links(parse(html, backend), ''))
+
+
+def parse_detail(html: str, backend: str) -> int:
+    return len(AttractiePage(parse(html, backend)).details)
+
+
+def bench(pages: List[str], func: Callable[[str, str], int], backend: str, repeat: int) -> tuple:
+    """Geef (beste tijd per pagina in ms, aantal gevonden items)."""
+    best, found = float('inf'), 0
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = sum(func(html, backend) for html in pages)
+        best = min(best, time.perf_counter() - start)
+
+    return best / max(len(pages), 1) * 1000, found
+
+
+def main(args: List[str]):
+    listing = read_pages(args[args.index('--listing') + 1]) if '--listing' in args else []
+    detail = read_pages(args[args.index('--detail') + 1]) if '--detail' in args else []
+    repeat = int(args[args.index('--repeat') + 1]) if '--repeat' in args else 3
+
+    if not listing and not detail:
+        print(__doc__)
+        return
+
+    print(f"{'pagina':<10}{'backend':<10}{'ms/pagina':>12}{'items':>10}")
+
+    for name, pages, func in (('listing', listing, parse_listing), ('detail', detail, parse_detail)):
+        if not pages:
+            continue
+
+        for backend in BACKENDS:
+            ms, found = bench(pages, func, backend, repeat)
+            print(f'{name:<10}{backend:<10}{ms:>12.2f}{found:>10}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
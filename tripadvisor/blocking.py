@@ -0,0 +1,80 @@
+"""
+Profielen voor het blokkeren van netwerkverkeer in chrome (via CDP).
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+from typing import List, Optional
+
+
+def _extensions(*extensions: str) -> List[str]:
+    """Patronen voor bestanden met deze extensies, ook met een query string (foto.jpg?w=400)."""
+    return [pattern for ext in extensions for pattern in (f'*.{ext}', f'*.{ext}?*')]
+
+
+ADS = [
+    '*doubleclick.net*',
+    '*googlesyndication.com*',
+    '*googletagmanager.com*',
+    '*google-analytics.com*',
+    '*googleadservices.com*',
+    '*amazon-adsystem.com*',
+    '*adsrvr.org*',
+    '*criteo.*',
+    '*facebook.net*',
+    '*facebook.com/tr*',
+    '*scorecardresearch.com*',
+    '*hotjar.com*',
+    '*bat.bing.com*',
+    '*taboola.com*',
+    '*outbrain.com*',
+    '*quantserve.com*',
+]
+IMAGES = _extensions('jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'ico', 'bmp')
+FONTS = _extensions('woff', 'woff2', 'ttf', 'otf', 'eot')
+MEDIA = _extensions('mp4', 'webm', 'm3u8', 'mp3')
+STYLES = _extensions('css')
+SCRIPTS = _extensions('js')
+
+BLOCK_PROFILES = {
+    # niets blokkeren
+    'geen': [],
+    # alleen advertenties en trackers
+    'advertenties': ADS,
+    # categorie/listing pagina's: javascript en css nodig voor de 'next' knop
+    'listing': ADS + IMAGES + FONTS + MEDIA,
+    # attractie pagina's: alleen html met het ld+json script is nodig (niet voor listing
+    # pagina's, en zonder css werkt de rating uit :after niet)
+    'ldjson': ADS + IMAGES + FONTS + MEDIA + STYLES + SCRIPTS,
+}
+
+
+def blocked_urls(profile: Optional[str]) -> List[str]:
+    """Geef de url patronen van een blokkeer profiel."""
+    if not profile:
+        return []
+
+    try:
+        return BLOCK_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f'Onbekend blokkeer profiel: {profile} (kies uit {", ".join(BLOCK_PROFILES)})')
+
+
+def blocks(profile: Optional[str], patterns: List[str]) -> bool:
+    """Blokkeert het profiel (een van) deze patronen?"""
+    urls = blocked_urls(profile)
+    return any(p in urls for p in patterns)
+
+
+def listing_profile(profile: Optional[str]) -> Optional[str]:
+    """Profiel voor categorie/listing pagina's: de 'See all' en 'next' knoppen hebben js en css nodig."""
+    if blocks(profile, SCRIPTS + STYLES):
+        print(f"Blokkeer profiel {profile} breekt listing pagina's, daar wordt 'listing' gebruikt.")
+        return 'listing'
+
+    return profile
+
+
+def styles_profile(profile: Optional[str]) -> Optional[str]:
+    """Profiel waarmee computed styles werken (rating uit de :after van de bubbels)."""
+    return 'listing' if blocks(profile, STYLES) else profile
@@ -1,7 +1,8 @@
+import base64
+import json
 import os
-import time
 from pathlib import Path
-from typing import Optional, List, Union, Tuple
+from typing import Dict, Optional, List, Union, Tuple
 from urllib.parse import urlparse
 
 import bs4
@@ -10,8 +11,26 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 from selenium.webdriver import Chrome, ChromeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.support.wait import WebDriverWait
+
+from tripadvisor.blocking import blocked_urls
+from tripadvisor.fixtures import record_page
+from tripadvisor.metrics import incr, observe, timer
+from tripadvisor.parser import parse
+from tripadvisor.recycle import RecyclePolicy, get_policy, rss_mb
+
+SCRIPT_TIME_OUT = 30
+READY_TIME_OUT = 20
+
+# lock/sessie bestanden die chrome in een profiel achterlaat; de http cache blijft staan
+PROFILE_LOCKS = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+PROFILE_SESSIONS = ('Default/Sessions', 'Default/Current Session', 'Default/Current Tabs',
+                    'Default/Last Session', 'Default/Last Tabs')
+PIDS_FILE = 'scraper.pids'
+DISK_CACHE_SIZE = 500 * 1024 * 1024
+KILL_TIME_OUT = 3
+
+JSON_MIME_TYPES = ('application/json', 'text/json', '+json')
+ERROR_URL = 'chrome-error://'
 
 
 def singleton(class_):
@@ -25,20 +44,70 @@ def singleton(class_):
     return getinstance
 
 
-@singleton
-class Browser:
-    """Class controlling the browser instance."""
+class ChromeBrowser:
+    """Class controlling a browser instance."""
 
     headless = False
+    port: int = 9222
+    profile: str = 'chrome-data'
+    blocking: Optional[str] = None
+    fresh_profile: bool = False
+    capture_json: bool = False
+    pages: int = 0
+    pages_since_start: int = 0
+    _recycle: Optional[RecyclePolicy] = None
     _driver: Optional[WebDriver] = None
+    _processes: List[psutil.Process] = []
+    _captured: List[dict] = []
+    _pending: Dict[str, dict] = {}
+
+    def __init__(self, url: str = None, headless: bool = True, init: bool = True,
+                 port: int = 9222, profile: str = 'chrome-data', kill_existing: bool = True,
+                 blocking: str = None, fresh_profile: bool = False, recycle: RecyclePolicy = None,
+                 capture_json: bool = False):
+        """
+        Initialize browser.
+
+        port:
+            remote debugging port, moet uniek zijn per browser
+
+        profile:
+            user data directory, moet uniek zijn per browser
+
+        kill_existing:
+            beëindig achtergebleven chrome processen van een vorige run met dit profiel
+            (andere chrome processen op de machine blijven draaien)
 
-    def __init__(self, url: str = None, headless: bool = True, init: bool = True):
-        """Initialize browser."""
+        blocking:
+            naam van een blokkeer profiel uit tripadvisor.blocking.BLOCK_PROFILES
+
+        fresh_profile:
+            begin met een leeg profiel in plaats van het warme profiel (met http cache)
+
+        recycle:
+            drempels voor automatisch herstarten (None = tripadvisor.recycle.get_policy())
+
+        capture_json:
+            netwerk logging aan, zodat de JSON (XHR) responses van een pagina via
+            captured_json() uit te lezen zijn
+        """
         self.headless = headless
+        self.port = port
+        self.profile = profile
+        self.fresh_profile = fresh_profile
+        self.pages = 0
+        self.pages_since_start = 0
+        self._recycle = recycle
+        self.capture_json = capture_json
+        self._processes = []
+        self._captured = []
+        self._pending = {}
 
         if init and self._driver is None:
-            self.kill_existing_drivers()
+            if kill_existing:
+                self.kill_stale_processes()
             self._driver = self._init_chrome()
+            self.set_blocking(blocking)
 
             if url:
                 self.get(url, ignore_errors=True)
@@ -56,12 +125,13 @@ class Browser:
         from selenium.common.exceptions import WebDriverException
 
         try:
-            if self._driver.title:
-                return True
+            self._driver.title  # ook een lege titel (about:blank) betekent dat hij reageert
 
         except (WebDriverException, MaxRetryError):
             return False
 
+        return True
+
     if os.name == 'nt':
         CHR_PATH = Path(r'C:\Users\Roel\PycharmProjects\scrapers\tripadvisor\driver\chromedriver.exe')
     else:
@@ -70,6 +140,7 @@ class Browser:
 
     @staticmethod
     def kill_existing_drivers():
+        """Beëindig alle chrome processen op de machine (alleen voor handmatig opruimen)."""
         for proc in psutil.process_iter():
             name = proc.name()
 
@@ -77,8 +148,227 @@ class Browser:
                 print(f'terminated process: {name} ({proc.pid})')
                 proc.terminate()
 
+    @property
+    def profile_path(self) -> Path:
+        return Path.cwd() / self.profile
+
+    @property
+    def recycle(self) -> RecyclePolicy:
+        return self._recycle or get_policy()
+
+    def rss_mb(self) -> float:
+        """RSS in MB van chromedriver en alle chrome processen."""
+        return rss_mb(self.processes)
+
+    def recycle_due(self) -> str:
+        """Reden om te herstarten volgens de recycle policy ('pages', 'rss' of '')."""
+        policy = self.recycle
+        rss = self.rss_mb() if policy.check_rss(self.pages_since_start) else None
+        return policy.reason(self.pages_since_start, rss)
+
+    def recycle_now(self, reason: str):
+        incr(f'browser.recycle.{reason}')
+        print(f'browser recyclen ({reason}): {self.pages_since_start} pagina\'s, {self.rss_mb():.0f} MB')
+        self.restart()
+
+    def before_page(self):
+        """Herstart de browser als de drempels van de recycle policy bereikt zijn."""
+        reason = self.recycle_due()
+
+        if reason:
+            self.recycle_now(reason)
+
+    def navigate(self, url: str):
+        """
+        driver.get met automatisch recyclen.
+
+        Als de browser tijdens het laden vastloopt of crasht wordt hij herstart en wordt
+        dezelfde url opnieuw geladen (maximaal recycle.retries keer).
+        """
+        from selenium.common.exceptions import WebDriverException
+
+        self.before_page()
+        self._reset_capture()
+        retries = self.recycle.retries
+
+        for attempt in range(retries + 1):
+            try:
+                self._driver.get(url)
+                break
+
+            except WebDriverException:
+                if attempt == retries or self.running:
+                    raise
+
+                incr('browser.recycle.crash', url=url)
+                print(f'browser gecrasht bij {url}, herstarten...')
+                self.restart()
+
+        self.pages += 1
+        self.pages_since_start += 1
+
+    def _reset_capture(self):
+        """Gooi de netwerk log van de vorige pagina weg."""
+        self._captured, self._pending = [], {}
+
+        if self.capture_json and self._driver is not None:
+            self._driver.get_log('performance')
+
+    def captured_json(self, url_contains: str = None) -> List[dict]:
+        """
+        JSON responses sinds de laatste navigate (alleen met capture_json).
+
+        Geeft [{'url', 'status', 'data'}] in volgorde van binnenkomst. Responses die nog
+        niet klaar zijn met laden komen bij een volgende aanroep mee.
+        """
+        if not self.capture_json or self._driver is None:
+            return []
+
+        from selenium.common.exceptions import WebDriverException
+
+        finished = []
+        for entry in self._driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+
+            method, params = message.get('method'), message.get('params', {})
+
+            if method == 'Network.responseReceived':
+                response = params.get('response', {})
+                if any(m in response.get('mimeType', '') for m in JSON_MIME_TYPES):
+                    self._pending[params['requestId']] = {'url': response.get('url'), 'status': response.get('status')}
+
+            elif method == 'Network.loadingFinished':
+                finished.append(params.get('requestId'))
+
+        for request_id in finished:
+            response = self._pending.pop(request_id, None)
+            if response is None:
+                continue
+
+            try:
+                body = self._driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                text = body['body']
+                if body.get('base64Encoded'):
+                    text = base64.b64decode(text).decode('utf-8')
+
+                response['data'] = json.loads(text)
+
+            except (WebDriverException, KeyError, ValueError) as e_:
+                incr('capture.error', url=response['url'])
+                print(f'geen json body voor {response["url"]}: {e_}')
+                continue
+
+            incr('capture.json')
+            self._captured.append(response)
+
+        return [r for r in self._captured if url_contains is None or url_contains in (r['url'] or '')]
+
+    def start_navigation(self, url: str):
+        """
+        Begin met laden in de huidige tab zonder op de pagina te wachten (zie page_loaded).
+
+        Net als navigate wordt eerst gerecycled als dat nodig is; de TabPool kijkt daar zelf
+        al naar voordat hij een tab start, zodat er geen tabs halverwege verloren gaan.
+        """
+        self.before_page()
+        self._reset_capture()
+        self._driver.execute_script(JS_START_NAVIGATION, url)
+        self.pages += 1
+        self.pages_since_start += 1
+
+    def page_loaded(self) -> bool:
+        """
+        Is de pagina uit start_navigation in de huidige tab geladen.
+
+        Een chrome foutpagina (geen verbinding, dns, ...) geeft een RuntimeError en een fout
+        van de driver wordt opgegooid, zodat de pagina opnieuw geprobeerd kan worden in plaats
+        van als geladen verwerkt te worden.
+        """
+        url = self._driver.execute_script(JS_PAGE_LOADED)
+
+        if url and url.startswith(ERROR_URL):
+            raise RuntimeError(f'chrome foutpagina: {url}')
+
+        return bool(url)
+
+    def open_tabs(self, n: int) -> List[str]:
+        """Zorg voor (minstens) n tabs en geef de eerste n window handles."""
+        handles = self._driver.window_handles
+
+        while len(handles) < n:
+            self._driver.execute_script("window.open('about:blank', '_blank');")
+            new = [h for h in self._driver.window_handles if h not in handles]
+            handles = self._driver.window_handles
+
+            # blokkeren geldt per tab
+            for handle in new:
+                if self.blocking:
+                    self._driver.switch_to.window(handle)
+                    self._block_urls(blocked_urls(self.blocking))
+
+        return handles[:n]
+
+    @property
+    def processes(self) -> List[psutil.Process]:
+        """Chromedriver en alle chrome processen die daaronder gestart zijn."""
+        procs = [p for p in self._processes if p.is_running()]
+
+        for root in list(procs):
+            try:
+                procs.extend(c for c in root.children(recursive=True) if c not in procs)
+            except psutil.Error:
+                pass
+
+        return procs
+
+    def _track_processes(self, chrome: Chrome):
+        """Onthoud het chromedriver proces (en pid's in het profiel, voor een volgende run)."""
+        try:
+            self._processes = [psutil.Process(chrome.service.process.pid)]
+        except (AttributeError, psutil.Error):
+            self._processes = []
+
+        pids = [[p.pid, p.create_time()] for p in self.processes]
+
+        with open(self.profile_path / PIDS_FILE, 'w') as f:
+            json.dump(pids, f)
+
+    def kill_processes(self):
+        """Beëindig de processen die deze browser gestart heeft."""
+        kill_processes(self.processes)
+        self._processes = []
+
+    def kill_stale_processes(self):
+        """Beëindig processen die een vorige run met dit profiel heeft laten staan."""
+        try:
+            with open(self.profile_path / PIDS_FILE, 'r') as f:
+                pids = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        stale = []
+        for pid, create_time in pids:
+            try:
+                proc = psutil.Process(pid)
+
+                # pid kan inmiddels hergebruikt zijn door een ander proces
+                if proc.create_time() == create_time:
+                    stale.append(proc)
+            except psutil.Error:
+                pass
+
+        if stale:
+            print(f'{len(stale)} achtergebleven processen beëindigen ({self.profile})')
+            kill_processes(stale)
+
     def _init_chrome(self, adblock: bool = False, incognito: bool = False) -> Chrome:
-        empty_dir(str(Path.cwd() / 'chrome-data'))
+        if self.fresh_profile:
+            empty_dir(str(self.profile_path))
+
+        prepare_profile(self.profile_path)
 
         chr_opt = ChromeOptions()
 
@@ -87,34 +377,60 @@ class Browser:
         chr_opt.add_argument('log-level=2')
         chr_opt.add_argument('--disable-logging')
         chr_opt.add_argument('--disable-remote-fonts')
-        chr_opt.add_argument("--user-data-dir=chrome-data")
-        chr_opt.add_argument("--remote-debugging-port=9222")
+        chr_opt.add_argument(f"--user-data-dir={self.profile}")
+        chr_opt.add_argument(f"--remote-debugging-port={self.port}")
         chr_opt.add_argument("--disable-infobars")
         chr_opt.add_argument("--disable-dev-shm-usage")
         chr_opt.add_argument("--ignore-certificate-errors")
         chr_opt.add_argument("--disable-gpu")
+        chr_opt.add_argument("--no-first-run")
+        chr_opt.add_argument("--no-default-browser-check")
+        chr_opt.add_argument("--disable-session-crashed-bubble")
+        chr_opt.add_argument(f"--disk-cache-size={DISK_CACHE_SIZE}")
 
         if adblock and not self.headless:  # headless + extensions = crash
             chr_opt.add_extension(
                 r'C:\Users\Roel\PycharmProjects\scrapers\tripadvisor\driver\ublock.crx.crx')
         if incognito:
             chr_opt.add_argument('--incognito')
+        if self.capture_json:
+            chr_opt.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
         if 'posix' in os.name:
             chr_opt.binary_location = '/home/vries274/scrapers/tripadvisor/chrome/chrome-linux/chrome'
 
         chrome = Chrome(executable_path=self.CHR_PATH, options=chr_opt)
+        self._track_processes(chrome)
+        self.pages_since_start = 0
         chrome.set_window_size(1920, 1080)
+        chrome.set_script_timeout(SCRIPT_TIME_OUT)
         print('\n ---  Browser started  --- \n')
         return chrome
 
+    def set_blocking(self, profile: Optional[str]):
+        """Blokkeer netwerkverzoeken volgens een blokkeer profiel (None = niets blokkeren)."""
+        urls = blocked_urls(profile)
+
+        if self._driver is None or profile == self.blocking:
+            return
+
+        if urls or self.blocking:
+            self._block_urls(urls)
+
+        self.blocking = profile
+
+    def _block_urls(self, urls: List[str]):
+        self._driver.execute_cdp_cmd('Network.enable', {})
+        self._driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+
     def get(self, url: str, max_retry: int = 10, ignore_errors: bool = False):
         counter = 0
         print('getting url...', url, self.driver.current_url)
 
         while self._driver.current_url != url and counter < max_retry:
-            self._driver.get(url)
-            wait_for_document_ready_state(self)
+            with timer('browser.get', url):
+                self.navigate(url)
+                wait_for_document_ready_state(self)
 
             if ignore_errors:
                 break
@@ -123,39 +439,56 @@ class Browser:
                 print('current url:', self._driver.current_url, f'({counter})')
 
     def restart(self):
-        """Restart webdriver."""
-        self.close()
-        self.kill()
-        self._driver = None
+        """Restart webdriver (met hetzelfde, warme profiel)."""
+        with timer('browser.restart'):
+            self.kill()
+
+            print('Restarting browser...')
+            blocking, self.blocking = self.blocking, None
+            self._driver = self._init_chrome()
+            self.set_blocking(blocking)
 
-        print('Restarting browser...')
-        self._driver = self._init_chrome(self.headless)
         return self
 
     def close(self):
         self._driver.close()
 
     def kill(self):
-        if self.running:
-            self._driver.close()
-            self._driver.quit()
-            print('Driver and browser closed...')
+        if self._driver is not None:
+            from selenium.common.exceptions import WebDriverException
 
-        else:
-            self.kill_existing_drivers()
+            try:
+                self._driver.quit()
+                print('Driver and browser closed...')
+            except WebDriverException:
+                pass
 
+        # quit laat soms renderers of een vastgelopen chrome achter
+        self.kill_processes()
         self._driver = None
 
 
+@singleton
+class Browser(ChromeBrowser):
+    """Class controlling the shared browser instance."""
+
+
 class Response:
     link: str
-    _browser: Browser
+    _browser: ChromeBrowser
     page_source: Optional[str]
     soup: Optional[bs4.BeautifulSoup]
+    blocking: Optional[str]
+    waited: Dict[str, Optional[float]]
 
-    def __init__(self, link: str, headless: bool = True, init: bool = False):
+    def __init__(self, link: str, headless: bool = True, init: bool = False, browser: ChromeBrowser = None,
+                 blocking: str = None):
         self.link = link
-        self._browser = Browser(headless=headless, init=init)
+        self.waited = {}
+        self.page_source = None
+        self.soup = None
+        self._browser = browser if browser is not None else Browser(headless=headless, init=init)
+        self.blocking = blocking
 
     @property
     def link(self):
@@ -173,72 +506,86 @@ class Response:
         self._link = value if uri_validator(value) else None
 
     def get_response(self, wait_for_elements: List[tuple] = None):
+        """Laad de pagina; een fout bij het laden wordt opgegooid (page_source blijft dan None)."""
+        self.page_source = None
+
         try:
-            self._browser.driver.get(self.link)
+            if self.blocking:
+                self._browser.set_blocking(self.blocking)
 
-        except:
-            self.page_source = None
+            with timer('response.navigate', self.link):
+                self._browser.navigate(self.link)
 
-        else:
-            wait_for_document_ready_state(self._browser, 'complete')
+        except Exception:
+            incr('response.error', url=self.link)
+            raise
+
+        self.complete(wait_for_elements)
 
-            if wait_for_elements:
-                for el, time_out in wait_for_elements:
-                    self.add_wait_for_element(el, time_out)
+    def start(self):
+        """Begin met laden in de huidige tab; daarna complete() als page_loaded() waar is."""
+        if self.blocking:
+            self._browser.set_blocking(self.blocking)
 
+        self._browser.start_navigation(self.link)
+
+    def complete(self, wait_for_elements: List[tuple] = None):
+        """Wacht op de elementen en lees de page source van de (geladen) pagina."""
+        with timer('response.wait', self.link):
+            self.waited = wait_until_ready(self._browser, wait_for_elements, 'complete')
+
+        with timer('response.page_source', self.link):
             self.page_source = self._browser.driver.page_source
 
+        incr('pages.browser')
+        record_page(self.link, self.page_source)
+
+    def json_responses(self, url_contains: str = None) -> List[dict]:
+        """JSON (XHR) responses van deze pagina, als de browser met capture_json draait."""
+        return self._browser.captured_json(url_contains)
+
     def create_soup(self):
         try:
-            self.soup = bs4.BeautifulSoup(self._browser.driver.page_source, features='lxml')
+            with timer('parse.soup', self.link):
+                self.soup = parse(self.page_source)
 
         except TypeError:
             self.soup = None
 
     def add_wait_for_element(self, xpath_elem, time_out: int = 5):
         """Wait for element to appear on website (Silently fail)."""
-        try:
-            wait_for_document_ready_state(self._browser)
-            element_present = ec.presence_of_element_located((By.XPATH, xpath_elem))
-            WebDriverWait(self._browser.driver, time_out).until(element_present)
+        wait_until_ready(self._browser, [(xpath_elem, time_out)])
 
-        except TimeoutException:
-            # print(f'Timed out ({self.link}) ({xpath_elem})')
-            pass
+    def get_css_values(self, elem: List[str], props: List[str] = None, by='xpath',
+                       pseudo: str = None) -> List[Optional[dict]]:
+        """
+        Computed style van alle selectors in één execute_script.
 
-    def get_css_properties(self, elem, prop: str, by='xpath', pseudo: str = None) -> List:
-        driver = self._browser.driver
-        prop = f"var prop = \'{prop}\';" if prop else ''
-        item = "return items[prop];" if prop else "return items;"
-        pseudo = f"\'{pseudo}\'" if pseudo else 'null'
+        elem:
+            lijst met selectors (xpath of css, zie by)
 
-        if by == 'css':
-            by = By.CSS_SELECTOR
-        if by == 'xpath':
-            by = By.XPATH
+        props:
+            alleen deze properties ophalen (snel, via getPropertyValue); None = alle properties
 
-        results = []
+        Geeft per selector een dict {property: waarde}, of None als het element niet bestaat.
+        """
+        if not elem:
+            return []
 
-        for el in elem:
+        with timer('response.css', self.link):
             try:
-                js = (
-                    "var items = {};"
-                    f"{prop}"
-                    f"var compsty = getComputedStyle(arguments[0], {pseudo});"
-                    "var len = compsty.length;"
-                    "for (index = 0; index < len; index++)"
-                    "   {items [compsty[index]] = compsty.getPropertyValue(compsty[index]);}"
-                    f"{item}"
+                return self._browser.driver.execute_script(
+                    JS_CSS_VALUES, list(elem), list(props or []), pseudo, by == 'xpath'
                 )
-                res = driver.execute_script(js, driver.find_element(by, el))
 
-            except (NoSuchElementException, JavascriptException):
-                pass
-
-            else:
-                results.append(res)
+            except JavascriptException as j:
+                print(j)
+                return [None] * len(elem)
 
-        return results
+    def get_css_properties(self, elem, prop: str, by='xpath', pseudo: str = None) -> List:
+        """Waarde van prop (of alle properties als dict) voor elk gevonden element."""
+        values = self.get_css_values(elem, [prop] if prop else None, by=by, pseudo=pseudo)
+        return [v[prop] if prop else v for v in values if v is not None]
 
     def get_css_property(self, elem, prop, by=By.XPATH, pseudo: str = ''):
         driver = self._browser.driver
@@ -255,19 +602,129 @@ class Response:
         return elem.get_property(prop)
 
 
-def wait_for_document_ready_state(browser, wait_for: str = None, time_out: float = 0.1):
+# Markeer het huidige document, zodat te zien is wanneer het nieuwe document geladen is.
+JS_START_NAVIGATION = "window.__taPending = true; window.location.href = arguments[0];"
+# de url van het geladen document, of null zolang de pagina nog laadt
+JS_PAGE_LOADED = "return !window.__taPending && document.readyState === 'complete' ? document.URL : null;"
+
+# Computed style van meerdere elementen in één round-trip. Met een lijst properties wordt
+# alleen getPropertyValue gedaan, zonder de hele computed style te serialiseren.
+JS_CSS_VALUES = """
+var selectors = arguments[0], props = arguments[1], pseudo = arguments[2], byXpath = arguments[3];
+
+function find(sel) {
+    if (byXpath) {
+        return document.evaluate(
+            sel, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+        ).singleNodeValue;
+    }
+    return document.querySelector(sel);
+}
+return selectors.map(function (sel) {
+    var el = null;
+    try { el = find(sel); } catch (e) { return null; }
+    if (!el) { return null; }
+
+    var style = getComputedStyle(el, pseudo), values = {}, i;
+    if (props.length) {
+        for (i = 0; i < props.length; i++) { values[props[i]] = style.getPropertyValue(props[i]); }
+    } else {
+        for (i = 0; i < style.length; i++) { values[style[i]] = style.getPropertyValue(style[i]); }
+    }
+    return values;
+});
+"""
+
+
+# Wacht in de pagina zelf (load event + MutationObserver) tot het document klaar is en alle
+# xpaths gevonden zijn of hun time-out verstreken is. Eén round-trip in plaats van polling.
+JS_WAIT_UNTIL_READY = """
+var waits = arguments[0], readyState = arguments[1], maxWait = arguments[2];
+var done = arguments[arguments.length - 1];
+var start = performance.now(), found = {}, observer = null, timers = [], finished = false;
+
+function present(xpath) {
+    return document.evaluate(
+        xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue !== null;
+}
+function finish() {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    timers.forEach(clearTimeout);
+    done(found);
+}
+function check() {
+    var pending = 0, elapsed = performance.now() - start;
+    waits.forEach(function (w) {
+        if (w[0] in found) { return; }
+        if (present(w[0])) { found[w[0]] = elapsed; }
+        else if (elapsed >= w[1]) { found[w[0]] = null; }
+        else { pending++; }
+    });
+    if (pending === 0) { finish(); }
+}
+function watch() {
+    check();
+    if (finished) { return; }
+    observer = new MutationObserver(check);
+    observer.observe(document, {childList: true, subtree: true});
+    waits.forEach(function (w) { timers.push(setTimeout(check, w[1])); });
+}
+function isReady() {
+    return readyState === 'complete' ? document.readyState === 'complete' : document.readyState !== 'loading';
+}
+
+timers.push(setTimeout(function () { waits.forEach(function (w) {
+    if (!(w[0] in found)) { found[w[0]] = null; } }); finish(); }, maxWait));
+
+if (isReady()) { watch(); }
+else {
+    var ev = readyState === 'complete' ? 'load' : 'DOMContentLoaded';
+    window.addEventListener(ev, function () { if (!finished) { watch(); } }, {once: true});
+}
+"""
+
+
+def wait_until_ready(browser, wait_for_elements: List[tuple] = None, wait_for: str = None,
+                     time_out: float = READY_TIME_OUT) -> dict:
+    """
+    Wacht tot het document klaar is en tot de opgegeven elementen aanwezig zijn (Silently fail).
+
+    wait_for_elements:
+        lijst met (xpath, time_out in seconden)
+
+    wait_for:
+        'complete' wacht op het load event, anders op DOMContentLoaded
+
+    Geeft per xpath de wachttijd in seconden terug, of None bij een time-out.
+    """
+    waits = [(xpath, el_time_out * 1000) for xpath, el_time_out in (wait_for_elements or [])]
+
     try:
-        ready_state = browser.driver.execute_script("return document.readyState;")
+        found = browser.driver.execute_async_script(
+            JS_WAIT_UNTIL_READY, waits, wait_for or 'interactive', min(time_out, SCRIPT_TIME_OUT - 1) * 1000
+        )
 
-        while ready_state == 'loading':
-            time.sleep(time_out)
-            ready_state = browser.driver.execute_script("return document.readyState;")
+    except (JavascriptException, TimeoutException) as e_:
+        print(f'Document Readystate ongeldig. ({e_.__class__.__name__})')
+        incr('wait.error')
+        return {}
 
-            if wait_for and ready_state == wait_for:
-                break
+    found = {k: v / 1000 if v is not None else None for k, v in (found or {}).items()}
+
+    for xpath, seconds in found.items():
+        if seconds is None:
+            incr('wait.element_timeout')
+        else:
+            observe('wait.element', seconds)
+
+    return found
 
-    except JavascriptException:
-        print('Document Readystate ongeldig.')
+
+def wait_for_document_ready_state(browser, wait_for: str = None):
+    wait_until_ready(browser, wait_for=wait_for)
 
 
 def scroll_down(browser: Browser):
@@ -350,4 +807,62 @@ def scroll_into_view(element: Union[tuple, List[Tuple]], browser: Browser):
 def empty_dir(dir_: str):
     import shutil
     print('removing ', dir_)
-    shutil.rmtree(dir_)
+    shutil.rmtree(dir_, ignore_errors=True)
+
+
+def prepare_profile(dir_: Union[str, Path]):
+    """
+    Maak een bestaand profiel klaar voor hergebruik.
+
+    Alleen lock en sessie bestanden worden verwijderd, zodat de http cache (scripts, css,
+    fonts) bewaard blijft. Een niet netjes afgesloten profiel wordt als afgesloten gemarkeerd.
+    """
+    import shutil
+
+    dir_ = Path(dir_)
+    dir_.mkdir(parents=True, exist_ok=True)
+
+    for name in PROFILE_LOCKS:
+        try:
+            os.unlink(dir_ / name)  # symlinks, ook als het doel niet meer bestaat
+        except FileNotFoundError:
+            pass
+
+    for name in PROFILE_SESSIONS:
+        path = dir_ / name
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink()
+
+    prefs_path = dir_ / 'Default' / 'Preferences'
+    try:
+        with open(prefs_path, 'r', encoding='utf-8') as f:
+            prefs = json.load(f)
+    except (OSError, ValueError):
+        return
+
+    profile = prefs.setdefault('profile', {})
+    if profile.get('exit_type') != 'Normal' or not profile.get('exited_cleanly'):
+        profile['exit_type'] = 'Normal'
+        profile['exited_cleanly'] = True
+
+        with open(prefs_path, 'w', encoding='utf-8') as f:
+            json.dump(prefs, f)
+
+
+def kill_processes(procs: List[psutil.Process], time_out: float = KILL_TIME_OUT):
+    """Terminate, en kill wat na time_out seconden nog draait."""
+    for proc in procs:
+        try:
+            proc.terminate()
+        except psutil.Error:
+            pass
+
+    _, alive = psutil.wait_procs(procs, timeout=time_out)
+
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
@@ -0,0 +1,114 @@
+"""
+Pagina's ophalen via een gedeelde HTTP sessie (zonder browser).
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import bs4
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from tripadvisor.fixtures import record_page
+from tripadvisor.metrics import incr, timer
+from tripadvisor.parser import parse
+
+POOL_SIZE = 16
+TIME_OUT = 15
+
+HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/86.0.4240.75 Safari/537.36'
+    ),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+_session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    """Geef de gedeelde sessie met connection pool (wordt bij eerste gebruik aangemaakt)."""
+    global _session
+
+    if _session is None:
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+        _session = requests.Session()
+        _session.headers.update(HEADERS)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+
+    return _session
+
+
+class HttpResponse:
+    """Zelfde interface als browser.Response, maar haalt alleen de ruwe html op."""
+
+    link: str
+    page_source: Optional[str]
+    soup: Optional[bs4.BeautifulSoup]
+    status_code: Optional[int]
+
+    def __init__(self, link: str):
+        self.link = link
+        self.page_source = None
+        self.soup = None
+        self.status_code = None
+
+    @property
+    def link(self):
+        return self._link
+
+    @link.setter
+    def link(self, value):
+        try:
+            result = urlparse(value)
+            valid = all([result.scheme, result.netloc, result.path])
+        except (AttributeError, TypeError, ValueError):
+            valid = False
+
+        self._link = value if valid else None
+
+    def get_response(self, wait_for_elements: List[tuple] = None):
+        """Haal de html op (wait_for_elements wordt genegeerd, er wordt niets gerenderd)."""
+        try:
+            with timer('http.get', self.link):
+                resp = get_session().get(self.link, timeout=TIME_OUT)
+
+        except requests.RequestException as e_:
+            print(f'HTTP fout: {self.link} ({e_.__class__.__name__})')
+            incr('http.error', url=self.link)
+            self.page_source = None
+
+        else:
+            self.status_code = resp.status_code
+            self.page_source = resp.text if resp.ok else None
+            incr('pages.http' if resp.ok else f'http.status_{resp.status_code}')
+            record_page(self.link, self.page_source)
+
+    def json_responses(self, url_contains: str = None) -> List[dict]:
+        """Zonder browser worden er geen XHR requests gedaan."""
+        return []
+
+    def create_soup(self):
+        try:
+            with timer('parse.soup', self.link):
+                self.soup = parse(self.page_source)
+
+        except TypeError:
+            self.soup = None
+
+    def get_css_values(self, elem: List[str], props: List[str] = None, by='xpath',
+                       pseudo: str = None) -> List[Optional[dict]]:
+        """Zonder browser geen computed styles."""
+        return [None] * len(elem)
+
+    def get_css_properties(self, elem, prop: str, by='xpath', pseudo: str = None) -> List:
+        """Zonder browser geen computed styles."""
+        return []
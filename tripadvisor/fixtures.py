@@ -0,0 +1,203 @@
+"""
+Opnemen en offline afspelen van tripadvisor pagina's.
+
+Tijdens een run met --record <map> (of TRIPADVISOR_RECORD=<map>) wordt elke gerenderde
+pagina opgeslagen: categorie pagina's (ook de volgende pagina's), listing pagina's en
+attractie pagina's met hun ld+json. Scripts (behalve ld+json) worden verwijderd en
+absolute tripadvisor links relatief gemaakt, zodat een afgespeelde pagina niets meer
+van buiten ophaalt.
+
+Afspelen:
+    python -m tripadvisor.fixtures serve <map> [--port 8765]
+
+en de scrapers er naartoe laten wijzen met TRIPADVISOR_BASE_URL=http://127.0.0.1:8765
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+INDEX = 'index.jsonl'
+PORT = 8765
+ORIGINS = ('https://www.tripadvisor.com', 'http://www.tripadvisor.com')
+
+_SCRIPT = re.compile(r'<script\b([^>]*)>.*?</script\s*>', re.IGNORECASE | re.DOTALL)
+_LD_JSON = re.compile(r'type\s*=\s*["\']application/ld\+json["\']', re.IGNORECASE)
+
+_recorder = None
+
+
+def page_key(url: str) -> str:
+    """Pad + query van een url, de sleutel waaronder een pagina opgeslagen wordt."""
+    parts = urlsplit(url)
+    return parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+def clean_html(html: str) -> str:
+    """Haal scripts weg (ld+json blijft) en maak tripadvisor links relatief."""
+    html = _SCRIPT.sub(lambda m: m.group(0) if _LD_JSON.search(m.group(1)) else '', html)
+
+    for origin in ORIGINS:
+        html = html.replace(origin, '')
+
+    return html
+
+
+class Recorder:
+    """Slaat pagina's op in een map met een index (JSONL, laatste opname wint)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, url: str, body: str, content_type: str = 'text/html'):
+        key = page_key(url)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest() + ('.html' if 'html' in content_type else '.json')
+
+        if 'html' in content_type:
+            body = clean_html(body)
+
+        with self._lock:
+            with open(os.path.join(self.root, name), 'w', encoding='utf-8') as f:
+                f.write(body)
+
+            with open(os.path.join(self.root, INDEX), 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'file': name, 'content_type': content_type}) + '\n')
+
+
+def start_recording(root: str) -> Recorder:
+    """Neem vanaf nu alle pagina's op in root (ook in shard processen, via de omgeving)."""
+    global _recorder
+
+    os.environ['TRIPADVISOR_RECORD'] = root
+    _recorder = Recorder(root)
+    return _recorder
+
+
+def recording() -> bool:
+    """Wordt er opgenomen? (voorkomt een extra driver.current_url als dat niet zo is)"""
+    global _recorder
+
+    if _recorder is None and os.environ.get('TRIPADVISOR_RECORD'):
+        _recorder = Recorder(os.environ['TRIPADVISOR_RECORD'])
+
+    return _recorder is not None
+
+
+def record_page(url: Optional[str], html: Optional[str], content_type: str = 'text/html'):
+    """Sla een pagina op als er opgenomen wordt (anders niets)."""
+    if recording() and url and html:
+        _recorder.save(url, html, content_type)
+
+
+def load_index(root: str) -> Dict[str, Tuple[str, str]]:
+    """sleutel -> (bestand, content type)."""
+    pages = {}
+
+    with open(os.path.join(root, INDEX), 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+
+            pages[entry['key']] = (os.path.join(root, entry['file']), entry['content_type'])
+
+    return pages
+
+
+class FixtureServer:
+    """HTTP server die opgenomen pagina's afspeelt (404 voor al het andere)."""
+
+    pages: Dict[str, Tuple[str, str]]
+    served: int
+    missing: List[str]
+
+    def __init__(self, root: str, port: int = PORT, host: str = '127.0.0.1'):
+        self.pages = load_index(root)
+        self.served = 0
+        self.missing = []
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        fixtures = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                page = fixtures.pages.get(page_key(self.path))
+
+                if page is None:
+                    with fixtures._lock:
+                        fixtures.missing.append(self.path)
+                    self.send_error(404)
+                    return
+
+                path, content_type = page
+                with open(path, 'rb') as f:
+                    body = f.read()
+
+                self.send_response(200)
+                self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+                if 'html' in content_type:
+                    with fixtures._lock:
+                        fixtures.served += 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Start de server in een achtergrond thread."""
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main(args: List[str]):
+    if len(args) < 2 or args[0] != 'serve':
+        print(__doc__)
+        return
+
+    port = int(args[args.index('--port') + 1]) if '--port' in args else PORT
+    server = FixtureServer(args[1], port)
+    print(f"{len(server.pages)} pagina's op {server.base_url} (ctrl-c om te stoppen)")
+
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
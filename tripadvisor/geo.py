@@ -0,0 +1,115 @@
+"""
+Kolomgewijze opslag van coördinaten en ruimtelijke koppeling aan gebieden.
+
+Gebieden (gemeenten, MRA deelgebieden) worden uit een lokaal GeoJSON bestand gelezen en
+in een STRtree gezet; alle attracties worden in één gevectoriseerde point-in-polygon join
+aan een gebied gekoppeld.
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import json
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+# posities van lat/lon in een Attractie.data record
+LAT, LON = 15, 16
+
+
+class CoordinateStore:
+    """Coördinaten als numpy arrays (lon, lat), met de attractie url als sleutel."""
+
+    keys: List[str]
+    lon: np.ndarray
+    lat: np.ndarray
+
+    def __init__(self, keys: Iterable[str], lon: Iterable[float], lat: Iterable[float]):
+        self.keys = list(keys)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_records(cls, records: Iterable[tuple]):
+        """Uit Attractie.data records (url op positie 2)."""
+        keys, lon, lat = [], [], []
+
+        for rec in records:
+            keys.append(rec[2])
+            lat.append(rec[LAT])
+            lon.append(rec[LON])
+
+        return cls(keys, lon, lat)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, key: str = 'attrac_url', lon: str = 'lon', lat: str = 'lat'):
+        return cls(df[key], df[lon].astype(float), df[lat].astype(float))
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Coördinaten die gevonden zijn (niet -1 en niet NaN)."""
+        return np.isfinite(self.lon) & np.isfinite(self.lat) & (self.lon != -1) & (self.lat != -1)
+
+
+class Gebieden:
+    """Polygonen met een naam, met STRtree index."""
+
+    names: List[str]
+
+    def __init__(self, geometries: list, names: List[str]):
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.names = list(names)
+        self.tree = STRtree(self.geometries)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_geojson(cls, path: str, name_field: str):
+        """
+        Lees een GeoJSON FeatureCollection (WGS84, lon/lat).
+
+        name_field:
+            property met de naam van het gebied (bijv. 'GM_NAAM' of 'DEELGEBIED')
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            features = json.load(f)['features']
+
+        geometries = [shape(ft['geometry']) for ft in features]
+        names = [ft['properties'].get(name_field) for ft in features]
+        return cls(geometries, names)
+
+
+def spatial_join(store: CoordinateStore, gebieden: Gebieden) -> np.ndarray:
+    """Naam van het gebied waarin elk punt ligt (None als het in geen enkel gebied ligt)."""
+    result = np.full(len(store), None, dtype=object)
+    valid = np.flatnonzero(store.valid)
+
+    if not len(valid) or not len(gebieden):
+        return result
+
+    points = shapely.points(store.lon[valid], store.lat[valid])
+    pt_idx, geom_idx = gebieden.tree.query(points, predicate='intersects')
+
+    # bij overlap wint het eerste gebied
+    order = np.lexsort((geom_idx, pt_idx))
+    pt_idx, geom_idx = pt_idx[order], geom_idx[order]
+    first = np.unique(pt_idx, return_index=True)[1]
+
+    names = np.asarray(gebieden.names, dtype=object)
+    result[valid[pt_idx[first]]] = names[geom_idx[first]]
+    return result
+
+
+def add_gebieden(df: pd.DataFrame, path: str, name_field: str, column: str = 'gebied',
+                 gebieden: Optional[Gebieden] = None) -> pd.DataFrame:
+    """Voeg een kolom met het gebied van elke attractie toe aan een dataframe met lat/lon."""
+    gebieden = gebieden or Gebieden.from_geojson(path, name_field)
+    return df.assign(**{column: spatial_join(CoordinateStore.from_frame(df), gebieden)})
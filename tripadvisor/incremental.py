@@ -0,0 +1,86 @@
+"""
+Incrementeel opnieuw scrapen op basis van wat de listing kaarten al laten zien.
+
+Alleen attracties die nieuw zijn, waarvan titel of aantal reviews op de listing kaart
+veranderd is, of die langer dan max_age niet opgehaald zijn, worden opnieuw via
+Attractie opgehaald. De rest wordt uit de vorige run overgenomen.
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from tripadvisor.journal import Journal, activity_key, attractie_key
+
+MAX_AGE_DAYS = 90
+
+
+def listing_signature(activity: tuple) -> list:
+    """
+    Titel (zonder rangnummer) en aantal reviews (indien zichtbaar) van een listing kaart.
+
+    Prijs, rang en badges veranderen vaak zonder dat de attractie pagina verandert.
+    """
+    reviews = activity[7] if len(activity) > 7 else -1
+    return [re.sub(r'^[0-9]+\.\s*', '', activity[0]), reviews]
+
+
+class PreviousRun:
+    """Listing kaarten en attracties van een eerdere run, gelezen uit diens journals."""
+
+    signatures: Dict[str, list]
+    attracties: Dict[str, Tuple[str, tuple]]
+
+    def __init__(self, journal_dir: str):
+        self.journal_dir = journal_dir
+        self.signatures = {}
+        self.attracties = {}
+
+        for act in Journal(f'{journal_dir}/activities.jsonl', activity_key):
+            self.signatures.setdefault(act[2], listing_signature(act))
+
+        for entry in Journal(f'{journal_dir}/attracties.jsonl', attractie_key).entries():
+            if 'data' in entry:
+                self.attracties[entry['key']] = (entry['ts'], tuple(entry['data']))
+
+        print(f'vorige run: {len(self.signatures)} listings, {len(self.attracties)} attracties ({journal_dir})')
+
+
+def plan(activities: Iterable[tuple], previous: PreviousRun,
+         max_age_days: float = MAX_AGE_DAYS) -> Tuple[List[str], List[Tuple[str, tuple]]]:
+    """
+    Bepaal welke attracties opnieuw opgehaald moeten worden.
+
+    Geeft (links om op te halen, [(ts, record)] om over te nemen uit de vorige run).
+    """
+    oldest = datetime.now() - timedelta(days=max_age_days)
+    todo, carried, seen = [], [], set()
+    new, changed, stale = 0, 0, 0
+
+    for act in activities:
+        link = act[2]
+
+        if link in seen:
+            continue
+        seen.add(link)
+
+        if link not in previous.attracties:
+            new += 1
+            todo.append(link)
+            continue
+
+        ts, record = previous.attracties[link]
+
+        if previous.signatures.get(link) != listing_signature(act):
+            changed += 1
+            todo.append(link)
+        elif datetime.fromisoformat(ts) < oldest:
+            stale += 1
+            todo.append(link)
+        else:
+            carried.append((ts, record))
+
+    print(f'incrementeel: {new} nieuw, {changed} gewijzigd, {stale} verouderd, {len(carried)} overgenomen')
+    return todo, carried
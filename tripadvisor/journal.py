@@ -0,0 +1,176 @@
+"""
+Append-only journal (JSONL) voor de scrape stappen.
+
+Elk record wordt direct na het scrapen weggeschreven, zodat een crash geen werk kost
+en een run met --resume verder kan waar hij gebleven was.
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import json
+import os
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional, Set
+
+
+class Journal:
+    """
+    Append-only JSONL bestand met één regel per record.
+
+    Regel: {"key": ..., "ts": ..., "data": [...]} of {"key": ..., "ts": ..., "done": true}
+    voor een afgeronde eenheid werk (bijv. een categorie).
+    """
+
+    path: str
+    key: Callable[[tuple], str]
+
+    def __init__(self, path: str, key: Callable[[tuple], str], fsync: bool = False):
+        """
+        key:
+            functie die de unieke sleutel (url) van een record geeft
+
+        fsync:
+            forceer elke regel naar disk (trager, maar ook veilig bij stroomuitval)
+        """
+        self.path = path
+        self.key = key
+        self.fsync = fsync
+        self._keys: Optional[Set[str]] = None
+        self._done: Optional[Set[str]] = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __contains__(self, key: str) -> bool:
+        self._load_keys()
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Alle records (zonder dubbelen), in volgorde van wegschrijven."""
+        seen = set()
+
+        for entry in self.entries():
+            if 'data' in entry and entry['key'] not in seen:
+                seen.add(entry['key'])
+                yield tuple(entry['data'])
+
+    def __len__(self) -> int:
+        self._load_keys()
+        return len(self._keys)
+
+    def entries(self) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # afgebroken laatste regel na een crash
+                    print(f'ongeldige regel in {self.path} overgeslagen')
+
+    def _load_keys(self):
+        if self._keys is None:
+            self._keys, self._done = set(), set()
+
+            for entry in self.entries():
+                (self._done if entry.get('done') else self._keys).add(entry['key'])
+
+    def _write(self, entry: dict):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+            if self._file.tell() > 0 and not self._ends_with_newline():
+                self._file.write('\n')
+
+        self._file.write(json.dumps(entry, default=str) + '\n')
+        self._file.flush()
+
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def append(self, record: tuple, ts: str = None):
+        """
+        ts:
+            tijdstip van scrapen (iso), standaard nu; gebruikt bij overnemen uit een eerdere run
+        """
+        self._load_keys()
+        key = self.key(record)
+
+        self._write({'key': key, 'ts': ts or datetime.now().isoformat(), 'data': list(record)})
+        self._keys.add(key)
+
+    def extend(self, records: Iterable[tuple]) -> int:
+        count = 0
+
+        for record in records:
+            self.append(record)
+            count += 1
+
+        return count
+
+    def mark_done(self, key: str):
+        """Markeer een eenheid werk (bijv. een categorie url) als volledig afgerond."""
+        self._load_keys()
+        self._write({'key': key, 'ts': datetime.now().isoformat(), 'done': True})
+        self._done.add(key)
+
+    def done(self, key: str) -> bool:
+        self._load_keys()
+        return key in self._done
+
+    def merge(self, paths: Iterable[str]) -> int:
+        """
+        Neem records en afgeronde eenheden over uit andere journals (bijv. van shards).
+
+        Records waarvan de sleutel al in dit journal staat worden overgeslagen.
+        Geeft het aantal overgenomen records.
+        """
+        self._load_keys()
+        count = 0
+
+        for path in paths:
+            for entry in Journal(path, self.key).entries():
+                key = entry.get('key')
+
+                if entry.get('done'):
+                    if key not in self._done:
+                        self.mark_done(key)
+
+                elif 'data' in entry and key not in self._keys:
+                    self.append(tuple(entry['data']), entry.get('ts'))
+                    count += 1
+
+        return count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def category_key(record: tuple) -> str:
+    return record[1]
+
+
+def activity_key(record: tuple) -> str:
+    return f'{record[6]} {record[2]}'
+
+
+def attractie_key(record: tuple) -> str:
+    return record[2]
+
+
+def dead_letter_key(record: tuple) -> str:
+    return str(record[0])
@@ -9,17 +9,45 @@ import pickle
 import signal
 import sys
 from datetime import datetime
-from pathlib import Path
-from typing import Tuple
+from functools import partial
+from typing import Iterable, Tuple
 
 import pandas as pd
-from more_itertools import flatten
 from selenium.common.exceptions import NoSuchElementException
 
-from tripadvisor.browser import Browser
-from tripadvisor.scrape_1 import get_categories
-from tripadvisor.scrape_2 import get_activities
-from tripadvisor.scrape_3 import Attractie
+from tripadvisor.blocking import STYLES, blocks, listing_profile, styles_profile
+from tripadvisor.browser import Browser, ChromeBrowser, Response, wait_until_ready
+from tripadvisor.fixtures import start_recording
+from tripadvisor.geo import add_gebieden
+from tripadvisor.incremental import MAX_AGE_DAYS, PreviousRun, plan
+from tripadvisor.journal import Journal, activity_key, attractie_key, category_key, dead_letter_key
+from tripadvisor.metrics import metrics
+from tripadvisor.parser import set_backend
+from tripadvisor.pool import BrowserPool
+from tripadvisor.recycle import RecyclePolicy, get_policy, set_policy
+from tripadvisor.scrape_1 import PROVINCES, check_provincies, get_categories
+from tripadvisor.scrape_2 import get_activities, get_activities_paged
+from tripadvisor.scrape_3 import URL, Attractie, rating_missing
+from tripadvisor.shard import activities_worker, attracties_worker, categories_worker, merge_existing, \
+    run_shards, shard_settings, split
+from tripadvisor.store import ACT_COLUMNS, ATT_COLUMNS, CAT_COLUMNS, to_frame, write_run
+from tripadvisor.supervisor import RETRIES, Supervisor
+from tripadvisor.tabs import TabPool
+from tripadvisor.waits import waits
+
+
+# eerste scrape datum: alleen bij toevoegen schrijven, anders is elke rij elke run 'gewijzigd'
+FIRST_SEEN = ['added']
+
+# kolomnamen in de records -> kolomnamen in de tabellen van Bases.py
+DB_COLUMNS = {
+    'ta_id': 'tripadvisor_id',
+    'percentage_excellent': 'pct_excellent',
+    'percentage_verygood': 'pct_verygood',
+    'percentage_average': 'pct_average',
+    'percentage_poor': 'pct_poor',
+    'percentage_terrible': 'pct_terrible',
+}
 
 
 def _datetime_now() -> str:
@@ -40,52 +68,18 @@ def create_dataframe(cat_dump: str, act_dump: str, attrs_dump: str) -> Tuple[pd.
     else:
         acts = []
 
+    # oudere runs hebben nog geen listing_reviews
+    acts = [tuple(a) + (-1,) * (8 - len(a)) for a in acts]
+
     if os.path.exists(attrs_dump):
         with open(attrs_dump, 'rb') as s3:
             attrs = pickle.load(s3)
     else:
         attrs = []
 
-    df_cats = pd.DataFrame(cats, columns=[
-        'categorie',
-        'cat_url',
-        'added',
-        'status',
-        'provincie'
-    ])
-
-    df_acts = pd.DataFrame(acts, columns=[
-        'titel',
-        'prijs',
-        'attrac_url',
-        'added',
-        'status',
-        'provincie',
-        'cat_url'
-    ])
-
-    df_attr = pd.DataFrame(
-        attrs,
-        columns=[
-            'status',
-            'titel',
-            'attrac_url',
-            'ta_id',
-            'beoordeling',
-            'adres',
-            'postcode',
-            'plaats',
-            'land',
-            'aantal_reviews',
-            'percentage_excellent',
-            'percentage_verygood',
-            'percentage_average',
-            'percentage_poor',
-            'percentage_terrible',
-            'lat',
-            'lon'
-        ],
-    )
+    df_cats = pd.DataFrame(cats, columns=CAT_COLUMNS)
+    df_acts = pd.DataFrame(acts, columns=ACT_COLUMNS)
+    df_attr = pd.DataFrame(attrs, columns=ATT_COLUMNS)
     return df_cats, df_acts, df_attr
 
 
@@ -103,7 +97,7 @@ def merge_(cats, acts, attrs):
     if cats.empty or acts.empty or attrs.empty:
         return pd.DataFrame()
 
-    acts.drop(columns=['titel'], inplace=True)
+    acts.drop(columns=['titel', 'listing_reviews'], inplace=True, errors='ignore')
 
     attrs = attrs.assign(**{'attrac_url': attrs['attrac_url'].apply(check_attr_url)})
     acts = acts.assign(**{'attrac_url': acts['attrac_url'].apply(check_attr_url)})
@@ -208,41 +202,69 @@ def _sqlcol(dfparam):
     return dtypedict
 
 
-def write_to_db(s1: list, s2: list, s3: set, data: pd.DataFrame) -> None:
-    """Write lists with data to database."""
+def _upsert_records(db, model, records: Iterable[tuple], columns: list, key: list,
+                    history=None, connection=None) -> dict:
+    """Voeg records samen met de tabel van model (alleen kolommen die de tabel heeft)."""
+    names = [DB_COLUMNS.get(c, c) for c in columns]
+    table_columns = set(model.__table__.columns.keys())
+    idx = [i for i, name in enumerate(names) if name in table_columns]
+
+    return db.upsert(
+        (tuple(rec[i] for i in idx) for rec in records),
+        model=model,
+        key=key,
+        columns=[names[i] for i in idx],
+        history=history,
+        keep=[c for c in FIRST_SEEN if c in table_columns],
+        connection=connection
+    )
+
+
+def write_to_db(s1: Iterable[tuple], s2: Iterable[tuple], s3: Iterable[tuple], data: pd.DataFrame) -> None:
+    """
+    Write lists with data to database.
+
+    Records worden via COPY in staging tabellen geladen en samengevoegd met de vaste tabellen;
+    alleen nieuwe en gewijzigde rijen worden geschreven, oude versies van attracties gaan naar
+    AttractiesHistorie. Combined is afgeleid en wordt per run vervangen.
+    """
     from .psql import Psql
-    from .Bases import Attractie, Activity, Categorie, SCHEMA
+    from .Bases import Attractie, AttractieHistorie, Activity, Categorie, SCHEMA
 
-    db = Psql(SCHEMA).set_sess_maker().set_engine(echo=False)
-    sessie = db.sessie_maker()
-    engine = db.engine
+    db = Psql(SCHEMA).set_engine(echo=False)
+    conn = db.engine.raw_connection()
 
     try:
-        sessie.add_all([Categorie(*c) for c in s1])
-        sessie.add_all([Activity(*a) for a in s2])
-        sessie.add_all([Attractie(*a) for a in s3])
-        sessie.commit()
+        _upsert_records(db, Categorie, s1, CAT_COLUMNS, ['cat_url'], connection=conn)
+        _upsert_records(db, Activity, s2, ACT_COLUMNS, ['attrac_url', 'cat_url'], connection=conn)
+        _upsert_records(db, Attractie, s3, ATT_COLUMNS, ['attrac_url'], history=AttractieHistorie, connection=conn)
+        conn.commit()
 
     except Exception as ex:
         print(ex.__class__)
-        sessie.rollback()
+        conn.rollback()
         raise
 
     finally:
-        sessie.close()
+        conn.close()
 
     try:
         dtypes = _sqlcol(data)
-        data.to_sql(
+        data.head(0).to_sql(
             'Combined',
-            engine,
+            db.engine,
             schema=SCHEMA,
             if_exists='replace',
             index=False,
-            method='multi',
-            chunksize=1000,
             dtype=dtypes
         )
+        db.copy_rows(
+            data.itertuples(index=False, name=None),
+            table='Combined',
+            schema=SCHEMA,
+            columns=list(data.columns),
+            binary=False
+        )
 
     except ValueError as e_:
         print(e_)
@@ -254,37 +276,16 @@ def print_update(begin_, aantal, type_):
     print(aantal, type_)
 
 
-def init_browser(base_url: str, head_less: bool):
-    if os.name == 'nt':
-        driver_path = Path(r'C:\Users\Roel\PycharmProjects\scrapers\tripadvisor\driver\chromedriver.exe')
-    else:
-        # CHR_PATH = Path().home() / 'chromedriver' / 'chromedriver'
-        driver_path = '/home/vries274/scrapers/tripadvisor/chromedriver/chromedriver'
-
-    arguments = [
-        "--no-sandbox",
-        'log-level=2',
-        '--disable-logging',
-        '--disable-remote-fonts',
-        "--remote-debugging-port=9222",
-        "--disable-infobars",
-        "--disable-dev-shm-usage",
-        "--ignore-certificate-errors",
-        "--disable-gpu"
-    ]
-    chrome = Browser(
-        headless=head_less,
-        driver_path=driver_path,
-        userdata_path='chrome-data',
-        arguments=arguments
-    )
-    chrome.get(base_url)
+def init_browser(base_url: str, head_less: bool, blocking: str = None) -> Browser:
+    # gedeelde browser (singleton), dezelfde die Attractie gebruikt zonder eigen browser
+    chrome = Browser(headless=head_less, blocking=blocking)
+    chrome.get(base_url, ignore_errors=True)
 
     # klik op continue om op tripadvisor.com te blijven
     try:
         cont = "//span[@class='continue']"
-        chrome.add_wait_for_element(('xpath', cont))
-        chrome.find_element_by_xpath(cont).click()
+        wait_until_ready(chrome, [(cont, 5)])
+        chrome.driver.find_element_by_xpath(cont).click()
 
     except NoSuchElementException:
         print("Continue niet gevonden. (al op tripadvisor.com)")
@@ -308,18 +309,31 @@ def dump_to(file_name: str, to_dump: list):
         print(f"{file_name} bevat geen data.")
 
 
+def dump_journals():
+    """Schrijf de journals weg als pickles (invoer voor create_dataframe)."""
+    for journal, file_name in ((jrn_cat, file_cat), (jrn_act, file_act), (jrn_att, file_att)):
+        journal.close()
+        dump_to(file_name, list(journal))
+
+
 def handle_sig_term(signum, frame):
     print("handling sudden stop")
     signal.signal(signum, signal.SIG_IGN)
 
     print("  -- FINALLY --  ")
-    dump_to(file_cat, categories)
-    dump_to(file_act, activities)
-    dump_to(file_att, attracties)
+    dump_journals()
 
     sys.exit(0)
 
 
+def scrape_attractie(browser: ChromeBrowser, link: str, engine: str = 'browser', blocking: str = None) -> tuple:
+    return Attractie(link, browser.headless, browser=browser, blocking=blocking, engine=engine).data
+
+
+def read_attractie(response: Response, link: str) -> tuple:
+    return Attractie(link, response=response).data
+
+
 def lees_pickle(path: str):
     with open(path, 'rb') as f:
         q = pickle.load(f)
@@ -333,6 +347,55 @@ if __name__ == '__main__':
 
     scrape = '--scrape' in args
     headless = '--headless' in args
+    workers = int(args[args.index('--workers') + 1]) if '--workers' in args else 1
+    # --shards N: stappen verdeeld over N processen, elk met een eigen browser
+    shards = int(args[args.index('--shards') + 1]) if '--shards' in args else 0
+    # --provincies A,B: alleen deze provincies uit scrape_1.PROVINCES
+    provincies = args[args.index('--provincies') + 1].split(',') if '--provincies' in args else list(PROVINCES)
+    provincies = check_provincies(provincies)
+    # --tabs N: N tabs in één browser in plaats van losse browsers
+    tabs = int(args[args.index('--tabs') + 1]) if '--tabs' in args else 1
+    # --blocking <profiel>: categorie/listing pagina's, --blocking-detail <profiel>: attractie pagina's
+    blocking = listing_profile(args[args.index('--blocking') + 1]) if '--blocking' in args else None
+    blocking_detail = args[args.index('--blocking-detail') + 1] if '--blocking-detail' in args else blocking
+    engine = 'http' if '--http' in args else 'browser'
+    paged = '--paged' in args
+    # --incremental <journal map vorige run>: alleen nieuwe/gewijzigde/verouderde attracties ophalen
+    previous = PreviousRun(args[args.index('--incremental') + 1]) if '--incremental' in args else None
+    max_age = float(args[args.index('--max-age') + 1]) if '--max-age' in args else MAX_AGE_DAYS
+    parquet = '--parquet' in args
+    # --gebieden <geojson> [--gebied-veld GM_NAAM]: elke attractie koppelen aan een gebied (geo.py)
+    gebieden_file = args[args.index('--gebieden') + 1] if '--gebieden' in args else None
+    gebied_veld = args[args.index('--gebied-veld') + 1] if '--gebied-veld' in args else 'GM_NAAM'
+    # --metrics <bestand>: timings per url als JSONL (+ Prometheus textfile <bestand>.prom)
+    metrics_file = args[args.index('--metrics') + 1] if '--metrics' in args else None
+
+    # --retries N: pogingen per attractie na de eerste, daarna naar dead_letter.jsonl in de journal map
+    retries = int(args[args.index('--retries') + 1]) if '--retries' in args else RETRIES
+    # --waits <bestand>: geleerde wachttijden van een vorige run gebruiken en bijwerken
+    waits_file = args[args.index('--waits') + 1] if '--waits' in args else None
+
+    if metrics_file:
+        metrics.open(metrics_file)
+
+    # --record <map>: alle gerenderde pagina's opslaan om later offline af te spelen (fixtures.py)
+    if '--record' in args:
+        start_recording(args[args.index('--record') + 1])
+
+    if waits_file:
+        waits.load(waits_file)
+
+    if '--parser' in args:
+        set_backend(args[args.index('--parser') + 1])
+
+    # --recycle-pages N / --recycle-mb N: browser herstarten na N pagina's of boven N MB (0 = uit)
+    if '--recycle-pages' in args or '--recycle-mb' in args:
+        set_policy(RecyclePolicy(
+            max_pages=int(args[args.index('--recycle-pages') + 1]) if '--recycle-pages' in args
+            else get_policy().max_pages,
+            max_rss_mb=float(args[args.index('--recycle-mb') + 1]) if '--recycle-mb' in args
+            else get_policy().max_rss_mb
+        ))
 
     categories = lees_pickle(args[args.index('--categories') + 1]) if '--categories' in args else []
     activities = lees_pickle(args[args.index('--activities') + 1]) if '--activities' in args else []
@@ -342,26 +405,126 @@ if __name__ == '__main__':
     begin_fmt = begin.strftime('%d-%m-%Y %H%M')
     output = f'{os.getcwd()}/results/{begin.strftime("%Y%m%d")}'
     os.makedirs(output, exist_ok=True)
-    
+
     file_cat = f'{output}/categories {begin_fmt}.pickle'
     file_act = f'{output}/activities {begin_fmt}.pickle'
     file_att = f'{output}/attracties {begin_fmt}.pickle'
 
-    browser = None
+    # --resume <map>: ga verder met de journals van een eerdere (afgebroken) run
+    journal_dir = args[args.index('--resume') + 1] if '--resume' in args else f'{output}/journal {begin_fmt}'
+    print(f'journal: {journal_dir}')
 
-    if scrape:
-        try:
-            browser = init_browser('http://www.tripadvisor.com', headless_=headless)
+    jrn_cat = Journal(f'{journal_dir}/categories.jsonl', category_key)
+    jrn_act = Journal(f'{journal_dir}/activities.jsonl', activity_key)
+    jrn_att = Journal(f'{journal_dir}/attracties.jsonl', attractie_key)
+
+    jrn_cat.extend(c for c in categories if category_key(c) not in jrn_cat)
+    jrn_act.extend(a for a in activities if activity_key(a) not in jrn_act)
+    jrn_att.extend(a for a in attracties if attractie_key(a) not in jrn_att)
 
-            if not categories and not activities and not activities:
-                categories.extend(get_categories(browser))
+    browser = None
 
-            if categories and not activities and not attracties:
-                activities.extend(flatten(get_activities(cat, browser) for cat in categories))  # if cat[0] == 'Tours'
+    shard_dir = f'{journal_dir}/shards'
+    shard_opts = {'headless': headless, 'settings': shard_settings(waits_file)}
 
-            if activities and not attracties:
-                activ_links = {act[2] for act in activities}
-                attracties.extend(Attractie(act_link, headless).data for act_link in activ_links)
+    if scrape and shards:
+        for stage, jrn in (('categories', jrn_cat), ('activities', jrn_act), ('attracties', jrn_att)):
+            merge_existing(shard_dir, stage, jrn)
+
+    if scrape:
+        try:
+            if not shards:
+                browser = init_browser(URL, headless, blocking)
+
+            if not len(jrn_cat) and not len(jrn_act) and not len(jrn_att):
+                with metrics.timer('stage.categories'):
+                    if shards:
+                        run_shards(categories_worker, split(provincies, shards), shard_dir, jrn_cat,
+                                   blocking=blocking, **shard_opts)
+                    else:
+                        jrn_cat.extend(get_categories(browser, provincies))
+
+            if len(jrn_cat) and not activities and not attracties:
+                if shards:
+                    with metrics.timer('stage.activities'):
+                        run_shards(activities_worker, split([c for c in jrn_cat if not jrn_act.done(c[1])], shards),
+                                   shard_dir, jrn_act, paged=paged, blocking=blocking, **shard_opts)
+
+                for cat in jrn_cat:  # if cat[0] == 'Tours'
+                    if jrn_act.done(cat[1]):
+                        continue
+
+                    with metrics.timer('stage.activities', cat[1]):
+                        if paged:
+                            jrn_act.extend(get_activities_paged(cat, browser))
+                        else:
+                            jrn_act.extend(get_activities(cat, browser))
+
+                    jrn_act.mark_done(cat[1])
+
+            if len(jrn_act) and not attracties:
+                activ_links = {act[2] for act in jrn_act}
+
+                if previous is not None:
+                    activ_links, carried = plan(jrn_act, previous, max_age)
+
+                    for ts, record in carried:
+                        if attractie_key(record) not in jrn_att:
+                            jrn_att.append(record, ts)
+
+                todo = [link for link in activ_links if link not in jrn_att]
+                print(f'{len(activ_links) - len(todo)} attracties al in journal, {len(todo)} te gaan')
+
+                supervisor = Supervisor(Journal(f'{journal_dir}/dead_letter.jsonl', dead_letter_key), retries)
+
+                with metrics.timer('stage.attracties'):
+                    if shards:
+                        try:
+                            run_shards(attracties_worker, split(sorted(todo), shards), shard_dir, jrn_att,
+                                       engine=engine, retries=retries, blocking=blocking_detail, **shard_opts)
+                        finally:
+                            supervisor.failed += merge_existing(shard_dir, 'dead_letter', supervisor.dead_letter)
+                    elif tabs > 1:
+                        # de tabs komen in de gedeelde browser, een tweede chrome op dezelfde poort
+                        # en hetzelfde profiel zou die browser als achtergebleven proces beëindigen
+                        pool = TabPool(browser, tabs, blocking=blocking_detail, url=lambda link: f'{URL}{link}')
+                        restyle = []
+
+                        for record in pool.map(read_attractie, todo, supervisor):
+                            if rating_missing(record) and blocks(blocking_detail, STYLES):
+                                restyle.append(record[2])
+                            else:
+                                jrn_att.append(record)
+
+                        # de rating uit :after heeft css nodig; die pagina's opnieuw zonder css te blokkeren
+                        jrn_att.extend(supervisor.run(
+                            lambda act_link: Attractie(
+                                act_link, headless, browser=browser, blocking=styles_profile(blocking_detail)
+                            ).data,
+                            restyle
+                        ))
+                    elif workers > 1:
+                        with BrowserPool(workers, headless, blocking=blocking_detail) as pool:
+                            jrn_att.extend(supervisor.map(
+                                pool, partial(scrape_attractie, engine=engine, blocking=blocking_detail), todo
+                            ))
+                    else:
+                        jrn_att.extend(supervisor.run(
+                            lambda act_link: Attractie(act_link, headless, blocking=blocking_detail, engine=engine).data,
+                            todo
+                        ))
+
+                if supervisor.failed:
+                    print(f'{supervisor.failed} attracties mislukt, zie {supervisor.dead_letter.path}')
+
+            if gebieden_file and len(jrn_att):
+                with metrics.timer('stage.gebieden'):
+                    df_geo = add_gebieden(to_frame('attracties', jrn_att), gebieden_file, gebied_veld)
+                    df_geo[['attrac_url', 'gebied']].to_csv(
+                        f'{output}/gebieden {begin_fmt}.csv', sep=';', index=False
+                    )
+
+                print(f"{df_geo['gebied'].notna().sum()} van {len(df_geo)} attracties in een gebied")
 
         except Exception as e:
             raise e
@@ -369,14 +532,24 @@ if __name__ == '__main__':
         finally:
             print("\n  -- FINALLY --  ")
 
-            dump_to(file_cat, categories)
-            dump_to(file_act, activities)
-            dump_to(file_att, attracties)
+            dump_journals()
+
+            if parquet:
+                write_run(jrn_cat, jrn_act, jrn_att, begin.date(), begin.strftime('%Y%m%d_%H%M'))
 
             if browser:
                 browser.kill()
 
             running_time(begin)
+            metrics.print_summary()
+            waits.print_report()
+
+            if waits_file:
+                waits.save(waits_file)
+
+            if metrics_file:
+                metrics.write_prometheus(f'{metrics_file}.prom')
+                metrics.close()
 
     """
     df_cat, df_act, df_att = create_dataframe(file_cat, file_act, file_att)
@@ -384,6 +557,7 @@ if __name__ == '__main__':
     if not df_cat.empty and not df_act.empty and not df_att.empty:
         df = merge_(df_cat, df_act, df_att)
         df = pivot_categories(df)
+        # df = add_gebieden(df, 'gebieden.geojson', 'GM_NAAM', column='gemeente')
 
         df.to_pickle(f'result {begin}.pickle')
         write_to_csv(df)
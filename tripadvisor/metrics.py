@@ -0,0 +1,170 @@
+"""
+Timings en tellers voor de scrape pipeline.
+
+Elke meting kan als JSONL regel (met url) naar een bestand; aan het eind van een run
+geeft summary() een tabel per stap en write_prometheus() een Prometheus textfile met
+histogrammen.
+
+    with timer('browser.get', url):
+        ...
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import json
+import re
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class Metrics:
+    """Verzameling timings (per naam) en tellers, thread-safe."""
+
+    timings: Dict[str, List[float]]
+    counters: Dict[str, int]
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self._lock = Lock()
+        self._sink = None
+
+    def open(self, path: str, mode: str = 'a'):
+        """Schrijf vanaf nu elke meting als JSONL regel naar path ('w' = bestand eerst leegmaken)."""
+        self.close()
+        self._sink = open(path, mode, encoding='utf-8')
+        return self
+
+    def close(self):
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def _emit(self, event: dict):
+        if self._sink is not None:
+            self._sink.write(json.dumps(event, default=str) + '\n')
+
+    def observe(self, name: str, seconds: float, url: Optional[str] = None):
+        with self._lock:
+            self.timings.setdefault(name, []).append(seconds)
+            self._emit({'ts': time.time(), 'type': 'timing', 'name': name, 'url': url, 'seconds': seconds})
+
+    def incr(self, name: str, n: int = 1, url: Optional[str] = None):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            self._emit({'ts': time.time(), 'type': 'counter', 'name': name, 'url': url, 'n': n})
+
+    def merge(self, path: str, skip: Tuple[str, ...] = ()) -> int:
+        """
+        Neem de metingen over uit het JSONL bestand van een ander proces (shard).
+
+        skip:
+            prefixen van namen die niet overgenomen worden (bijv. stappen die hier ook gemeten zijn)
+        """
+        count = 0
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+
+                name = event.get('name', '')
+                if name.startswith(skip):
+                    continue
+
+                if event.get('type') == 'timing':
+                    self.observe(name, event['seconds'], event.get('url'))
+                elif event.get('type') == 'counter':
+                    self.incr(name, event['n'], event.get('url'))
+                else:
+                    continue
+
+                count += 1
+
+        return count
+
+    @contextmanager
+    def timer(self, name: str, url: Optional[str] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, url)
+
+    def summary(self) -> str:
+        """Tabel met per meting aantal, totaal, gemiddelde, p50, p95 en max."""
+        with self._lock:
+            timings = {k: list(v) for k, v in self.timings.items()}
+            counters = dict(self.counters)
+
+        lines = [f"{'meting':<32}{'aantal':>8}{'totaal s':>10}{'gem ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+
+        for name, values in sorted(timings.items(), key=lambda kv: -sum(kv[1])):
+            lines.append(
+                f'{name:<32}{len(values):>8}{sum(values):>10.1f}{sum(values) / len(values) * 1000:>10.1f}'
+                f'{_percentile(values, 50) * 1000:>10.1f}{_percentile(values, 95) * 1000:>10.1f}'
+                f'{max(values) * 1000:>10.1f}'
+            )
+
+        if counters:
+            lines.append('')
+            lines.extend(f'{name:<32}{n:>8}' for name, n in sorted(counters.items()))
+
+        return '\n'.join(lines)
+
+    def print_summary(self):
+        print('\n' + self.summary() + '\n')
+
+    def write_prometheus(self, path: str, prefix: str = 'tripadvisor'):
+        """Schrijf een Prometheus textfile (histogram per meting, counter per teller)."""
+        with self._lock:
+            timings = {k: list(v) for k, v in self.timings.items()}
+            counters = dict(self.counters)
+
+        def metric_name(name: str) -> str:
+            return f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+        lines = []
+        for name, values in sorted(timings.items()):
+            m = f'{metric_name(name)}_seconds'
+            lines.append(f'# TYPE {m} histogram')
+
+            for bucket in BUCKETS:
+                lines.append(f'{m}_bucket{{le="{bucket}"}} {sum(1 for v in values if v <= bucket)}')
+
+            lines.append(f'{m}_bucket{{le="+Inf"}} {len(values)}')
+            lines.append(f'{m}_sum {sum(values)}')
+            lines.append(f'{m}_count {len(values)}')
+
+        for name, n in sorted(counters.items()):
+            m = f'{metric_name(name)}_total'
+            lines.append(f'# TYPE {m} counter')
+            lines.append(f'{m} {n}')
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+metrics = Metrics()
+timer = metrics.timer
+incr = metrics.incr
+observe = metrics.observe
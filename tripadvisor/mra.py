@@ -1,19 +1,111 @@
-from typing import Optional
+import os
+import pickle
+from functools import lru_cache
+from typing import Optional, Union
 
 import pandas as pd
 
-pc4 = pd.read_excel('pc4gem2015.xls', dtype=str)
+PC4_XLS = 'pc4gem2015.xls'
+MRA_XLS = 'mra regio CBS code 2016.xls'
+INDEX_CACHE = 'mra_index.pickle'
 
-mra = pd.read_excel(
-    'mra regio CBS code 2016.xls',
-    engine='xlrd',
-    dtype=str,
-    usecols=[0, 1, 2, 3],
-    names=['GEMEENTE', 'PROVINCIE', 'CBSCODE', 'DEELGEBIED']
-)
+_index: Optional[dict] = None
+_maps: dict = {}
 
-mra_pc4 = pc4.merge(mra, how='left', left_on='gemeentecode cbs', right_on='CBSCODE', validate='m:1')
-mra_pc4 = mra_pc4.loc[mra_pc4.GEMEENTE.notna()]
+
+@lru_cache(maxsize=1)
+def _read_sources() -> pd.DataFrame:
+    """De excel bestanden samengevoegd; één keer ingelezen (get_index leegt de cache bij wijzigingen)."""
+    pc4 = pd.read_excel(PC4_XLS, dtype=str)
+
+    mra = pd.read_excel(
+        MRA_XLS,
+        engine='xlrd',
+        dtype=str,
+        usecols=[0, 1, 2, 3],
+        names=['GEMEENTE', 'PROVINCIE', 'CBSCODE', 'DEELGEBIED']
+    )
+
+    mra_pc4 = pc4.merge(mra, how='left', left_on='gemeentecode cbs', right_on='CBSCODE', validate='m:1')
+    return mra_pc4.loc[mra_pc4.GEMEENTE.notna()]
+
+
+def _source_mtimes() -> list:
+    return [os.path.getmtime(p) for p in (PC4_XLS, MRA_XLS)]
+
+
+def normalize_plaats(plaats) -> str:
+    """Plaatsnaam zonder spaties, in kleine letters."""
+    return ''.join(str(plaats).split()).lower()
+
+
+def _build_index(mra_pc4: pd.DataFrame) -> dict:
+    """pc4 -> record en genormaliseerde plaats -> record (eerste voorkomen, net als .iloc[0])."""
+    columns = list(mra_pc4.columns)
+    by_pc4, by_plaats = {}, {}
+
+    for rec in mra_pc4.itertuples(index=False, name=None):
+        row = dict(zip(columns, rec))
+        by_pc4.setdefault(row['pc4'], rec)
+
+        if pd.notna(row['naam kern']):
+            by_plaats.setdefault(normalize_plaats(row['naam kern']), rec)
+
+    return {'mtimes': _source_mtimes(), 'columns': columns, 'pc4': by_pc4, 'plaats': by_plaats}
+
+
+def get_index() -> dict:
+    """
+    Lookup index, bij eerste gebruik geladen uit INDEX_CACHE.
+
+    De cache wordt opnieuw opgebouwd uit de excel bestanden als die gewijzigd zijn.
+    """
+    global _index
+
+    if _index is not None:
+        return _index
+
+    try:
+        with open(INDEX_CACHE, 'rb') as f:
+            cached = pickle.load(f)
+
+        if cached.get('mtimes') == _source_mtimes():
+            _index = cached
+            return _index
+
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    print('mra index opbouwen...')
+    _read_sources.cache_clear()
+    _index = _build_index(_read_sources())
+    _maps.clear()
+
+    with open(INDEX_CACHE, 'wb') as f:
+        pickle.dump(_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return _index
+
+
+def __getattr__(name: str):
+    # mra_pc4 werd eerder bij import ingelezen; nu pas bij (het eerste) gebruik
+    if name == 'mra_pc4':
+        return _read_sources()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_value(rec: Optional[tuple], ret: Union[str, list]):
+    index = get_index()
+
+    if rec is None:
+        raise IndexError
+
+    if isinstance(ret, list):
+        pos = [index['columns'].index(r) for r in ret]
+        return pd.Series([rec[p] for p in pos], index=ret)
+
+    return rec[index['columns'].index(ret)]
 
 
 def find_mra_gemeente(postcode: str = None, plaats: str = None, ret: list = None) -> Optional[str]:
@@ -33,6 +125,7 @@ def find_mra_gemeente(postcode: str = None, plaats: str = None, ret: list = None
     if postcode is None and plaats is None:
         raise ValueError("Geef postcode of plaats op.")
 
+    index = get_index()
     res = ''
 
     if ret:
@@ -43,21 +136,55 @@ def find_mra_gemeente(postcode: str = None, plaats: str = None, ret: list = None
 
     postcode = ''.join(filter(str.isalnum, str(postcode)))
 
-    if pd.notna(plaats) and plaats:
-        plaats = ''.join(filter(str.strip, str(plaats)))
-
     try:
-        res = mra_pc4.loc[mra_pc4.pc4 == postcode[:4], ret].iloc[0]
+        res = _get_value(index['pc4'].get(postcode[:4]), ret)
 
-    except (IndexError, KeyError):
+    except (IndexError, ValueError):
 
         if pd.notna(plaats) and plaats:
             try:
-                res = mra_pc4.loc[mra_pc4['naam kern'].str.lower() == plaats.lower(), ret].iloc[0]
-            except (IndexError, KeyError):
+                res = _get_value(index['plaats'].get(normalize_plaats(plaats)), ret)
+            except (IndexError, ValueError):
                 pass
 
     if isinstance(res, pd.Series):
         return res if not res.empty else pd.NA
 
     return res if res else pd.NA
+
+
+def _lookup_map(kind: str, column: str) -> pd.Series:
+    """pc4/plaats -> waarde van column, als Series voor Series.map."""
+    key = (kind, column)
+
+    if key not in _maps:
+        index = get_index()
+        pos = index['columns'].index(column)
+        _maps[key] = pd.Series({k: rec[pos] for k, rec in index[kind].items()}, dtype=object)
+
+    return _maps[key]
+
+
+def find_mra_gemeente_batch(postcodes: pd.Series, plaatsen: pd.Series = None,
+                            ret: Union[str, list] = 'CBSCODE') -> Union[pd.Series, pd.DataFrame]:
+    """
+    Gevectoriseerde find_mra_gemeente voor een hele kolom postcodes (en optioneel plaatsen).
+
+    Geeft een Series (één ret kolom) of DataFrame (meerdere) met dezelfde index als postcodes;
+    niet gevonden is pd.NA, net als bij find_mra_gemeente.
+    """
+    if isinstance(ret, list) and len(ret) != 1:
+        return pd.DataFrame({r: find_mra_gemeente_batch(postcodes, plaatsen, r) for r in ret})
+
+    column = ret[0] if isinstance(ret, list) else ret
+
+    pc4 = postcodes.astype(str).str.replace(r'[^0-9A-Za-z]', '', regex=True).str[:4]
+    res = pc4.map(_lookup_map('pc4', column))
+
+    if plaatsen is not None:
+        missing = res.isna() & plaatsen.notna()
+        kern = plaatsen[missing].astype(str).str.replace(r'\s+', '', regex=True).str.lower()
+        res[missing] = kern.map(_lookup_map('plaats', column))
+
+    res = res.astype(object)
+    return res.where(res.notna() & (res != ''), pd.NA).rename(column)
@@ -0,0 +1,195 @@
+"""
+HTML parser met verwisselbare backend (bs4 of lxml).
+
+Beide backends geven een document terug met dezelfde selector API: het deel van de
+BeautifulSoup API dat de scrapers gebruiken (find, find_all, select, get, get_text,
+attrs, string, name).
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import os
+import re
+from typing import Any, Iterator, List, Optional, Union
+
+import bs4
+
+BACKENDS = ('bs4', 'lxml')
+
+_backend = os.environ.get('TRIPADVISOR_PARSER', 'bs4')
+
+
+def set_backend(name: str):
+    """Kies de standaard parser backend ('bs4' of 'lxml')."""
+    global _backend
+
+    if name not in BACKENDS:
+        raise ValueError(f'Onbekende parser backend: {name} (kies uit {", ".join(BACKENDS)})')
+
+    _backend = name
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def parse(html: Optional[str], backend: str = None):
+    """Parse html met de gekozen backend (standaard: set_backend / TRIPADVISOR_PARSER)."""
+    backend = backend or _backend
+
+    if html is None:
+        raise TypeError('Geen html om te parsen.')
+
+    if backend == 'bs4':
+        return bs4.BeautifulSoup(html, features='lxml')
+    if backend == 'lxml':
+        return LxmlNode.from_html(html)
+
+    raise ValueError(f'Onbekende parser backend: {backend} (kies uit {", ".join(BACKENDS)})')
+
+
+def _match_value(matcher: Any, value: Optional[str], multi: bool) -> bool:
+    """Match een attribuut waarde zoals bs4 dat doet (class matcht per token)."""
+    if matcher is True:
+        return value is not None
+    if matcher is None or matcher is False:
+        return value is None
+
+    if value is None:
+        return False
+
+    if multi:
+        tokens = value.split()
+
+        if isinstance(matcher, str) and len(matcher.split()) > 1:
+            return ' '.join(tokens) == matcher
+
+        return any(_match_value(matcher, t, False) for t in tokens) or \
+            (not isinstance(matcher, str) and _match_value(matcher, value, False))
+
+    if isinstance(matcher, str):
+        return value == matcher
+    if isinstance(matcher, re.Pattern):
+        return matcher.search(value) is not None
+    if isinstance(matcher, (list, tuple, set, frozenset)):
+        return any(_match_value(m, value, False) for m in matcher)
+    if callable(matcher):
+        return bool(matcher(value))
+
+    return False
+
+
+class LxmlNode:
+    """Dunne wrapper om een lxml.html element met de bs4 selector API."""
+
+    __slots__ = ('_el',)
+
+    def __init__(self, el):
+        self._el = el
+
+    @classmethod
+    def from_html(cls, html: str):
+        import lxml.html
+        return cls(lxml.html.document_fromstring(html))
+
+    def __repr__(self):
+        return f'<LxmlNode {self.name}>'
+
+    def __eq__(self, other):
+        return isinstance(other, LxmlNode) and other._el is self._el
+
+    def __hash__(self):
+        return hash(self._el)
+
+    def __getitem__(self, item: str):
+        value = self.get(item)
+
+        if value is None:
+            raise KeyError(item)
+
+        return value
+
+    @property
+    def name(self) -> str:
+        return self._el.tag
+
+    @property
+    def attrs(self) -> dict:
+        return {k: self.get(k) for k in self._el.attrib}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._el.get(key)
+
+        if value is None:
+            return default
+
+        return value.split() if key == 'class' else value
+
+    def get_text(self, separator: str = '', strip: bool = False) -> str:
+        texts = self._el.itertext()
+
+        if strip:
+            texts = (t.strip() for t in texts)
+            texts = (t for t in texts if t)
+
+        return separator.join(texts)
+
+    @property
+    def string(self) -> Optional[str]:
+        children = [c for c in self._el if isinstance(c.tag, str)]
+
+        if not children:
+            return self._el.text
+        if len(children) == 1 and not (self._el.text or '').strip() and not (children[0].tail or '').strip():
+            return LxmlNode(children[0]).string
+
+        return None
+
+    def _iter(self, name: Union[str, List[str], None]) -> Iterator:
+        if name is None or name is True:
+            tags = ()
+        elif isinstance(name, str):
+            tags = (name,)
+        else:
+            tags = tuple(name)
+
+        for el in self._el.iter(*tags):
+            if el is not self._el and isinstance(el.tag, str):
+                yield el
+
+    def find_all(self, name: Union[str, List[str], None] = None, attrs: Any = None,
+                 limit: int = None, **kwargs) -> List['LxmlNode']:
+        if attrs is not None and not isinstance(attrs, dict):
+            attrs = {'class': attrs}
+
+        attrs = dict(attrs or {})
+        if 'class_' in kwargs:
+            attrs['class'] = kwargs.pop('class_')
+        attrs.update(kwargs)
+
+        found = []
+        for el in self._iter(name):
+            if all(_match_value(m, el.get(k), k == 'class') for k, m in attrs.items()):
+                found.append(LxmlNode(el))
+
+                if limit and len(found) >= limit:
+                    break
+
+        return found
+
+    def find(self, name: Union[str, List[str], None] = None, attrs: Any = None, **kwargs) -> Optional['LxmlNode']:
+        found = self.find_all(name, attrs, limit=1, **kwargs)
+        return found[0] if found else None
+
+    def select(self, selector: str) -> List['LxmlNode']:
+        return [LxmlNode(el) for el in self._el.cssselect(selector)]
+
+    def select_one(self, selector: str) -> Optional['LxmlNode']:
+        found = self.select(selector)
+        return found[0] if found else None
+
+
+def class_prefix(prefix: str) -> re.Pattern:
+    """Class matcher voor classes die met prefix beginnen (werkt in beide backends)."""
+    return re.compile(f'^{re.escape(prefix)}')
+
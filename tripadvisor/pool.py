@@ -0,0 +1,143 @@
+"""
+Pool van browsers om pagina's parallel op te halen.
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+from queue import Queue
+from threading import Thread
+from typing import Callable, Iterable, Iterator, List, Any
+
+from selenium.common.exceptions import WebDriverException
+
+from tripadvisor.browser import ChromeBrowser
+from tripadvisor.metrics import incr
+from tripadvisor.recycle import RecyclePolicy
+
+# 9222 is de poort van de gedeelde Browser die main altijd eerst start
+BASE_PORT = 9223
+PROFILE_DIR = 'chrome-data'
+
+_STOP = object()
+
+
+class BrowserPool:
+    """
+    Pool met N losse chrome browsers, elk met een eigen poort en profiel.
+
+    Links worden via een werkrij uitgedeeld aan de browser die vrij is.
+    """
+
+    workers: int
+    headless: bool
+    browsers: List[ChromeBrowser]
+
+    def __init__(self, workers: int = 2, headless: bool = True,
+                 base_port: int = BASE_PORT, profile_dir: str = PROFILE_DIR, blocking: str = None,
+                 recycle: RecyclePolicy = None):
+        self.workers = max(1, workers)
+        self.headless = headless
+        self.blocking = blocking
+        self.base_port = base_port
+        self.profile_dir = profile_dir
+        self.recycle = recycle
+        self.browsers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        """Start alle browsers (achtergebleven processen van elk profiel worden beëindigd)."""
+        for i in range(self.workers):
+            self.browsers.append(ChromeBrowser(
+                headless=self.headless,
+                port=self.base_port + i,
+                profile=f'{self.profile_dir}-{i}',
+                kill_existing=True,
+                blocking=self.blocking,
+                recycle=self.recycle
+            ))
+
+        print(f'\n ---  {self.workers} browsers gestart  --- \n')
+        return self
+
+    def close(self):
+        for browser in self.browsers:
+            try:
+                browser.kill()
+            except Exception as e_:
+                print(f'browser op poort {browser.port} niet gesloten: {e_}')
+
+        self.browsers = []
+
+    @staticmethod
+    def _run(func: Callable, browser: ChromeBrowser, item) -> tuple:
+        """
+        func(browser, item) als (ok, resultaat of fout).
+
+        Crasht de browser onderweg, dan wordt hij herstart en gaat het item opnieuw naar
+        dezelfde (verse) browser in plaats van verloren te gaan.
+        """
+        for attempt in range(browser.recycle.retries + 1):
+            try:
+                return True, func(browser, item)
+
+            except WebDriverException as e_:
+                if attempt == browser.recycle.retries or browser.running:
+                    return False, e_
+
+                incr('pool.requeued')
+                print(f'browser op poort {browser.port} gecrasht, item opnieuw: {item}')
+                browser.restart()
+
+            except Exception as e_:
+                return False, e_
+
+    def map(self, func: Callable[[ChromeBrowser, Any], Any], items: Iterable) -> Iterator:
+        """
+        Voer func(browser, item) uit voor elk item, verdeeld over de browsers.
+
+        Resultaten komen terug in volgorde van afronden. Een fout in een van de
+        workers wordt opnieuw opgegooid.
+        """
+        if not self.browsers:
+            self.start()
+
+        tasks, results = Queue(), Queue()
+
+        def work(browser: ChromeBrowser):
+            while True:
+                item = tasks.get()
+
+                if item is _STOP:
+                    results.put(_STOP)
+                    break
+
+                results.put(self._run(func, browser, item))
+
+        for item in items:
+            tasks.put(item)
+
+        for _ in self.browsers:
+            tasks.put(_STOP)
+
+        threads = [Thread(target=work, args=(b,), daemon=True) for b in self.browsers]
+        for t in threads:
+            t.start()
+
+        stopped = 0
+        while stopped < len(threads):
+            res = results.get()
+
+            if res is _STOP:
+                stopped += 1
+                continue
+
+            ok, value = res
+            if not ok:
+                raise value
+
+            yield value
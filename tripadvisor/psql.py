@@ -4,12 +4,22 @@ Postgresql class.
 @author: Roel de Vries
 @email: rwdevries89@gmail.com
 """
+import csv
+import struct
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from typing import Callable, Iterable, Iterator, List
 
-from sqlalchemy import (Column, Float, Integer, MetaData, Table, Text,
+from sqlalchemy import (BigInteger, Boolean, Column, Date, DateTime, Float,
+                        Integer, MetaData, Numeric, SmallInteger, Table, Text,
                         create_engine)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from tripadvisor.metrics import incr, observe
+
 DIALECT = 'postgresql'
 USER = ''
 PW = ''
@@ -17,6 +27,10 @@ ADDRESS = ''
 PORT = '5432'
 DB = 'toerisme'
 
+COPY_CHUNK_ROWS = 5000
+PG_EPOCH = date(2000, 1, 1)
+PG_EPOCH_TS = datetime(2000, 1, 1)
+
 
 class Psql:
     """Postgresql database class."""
@@ -63,33 +77,105 @@ class Psql:
         else:
             return declarative_base(bind=self.engine)
 
-    @staticmethod
-    def _create_io_from_data(df):
-        from io import StringIO
+    def fill_table(self, df, schema, table, echo: bool = True):
+        """Vul tabel met dataframe (gestreamd via COPY, geen kopie van de data als csv in geheugen)."""
+        if self.engine is None:
+            self.engine = self._create_pg_engine(echo)
 
-        output = StringIO()
-        df.to_csv(output, sep=';', header=False,
-                  encoding='utf-8', index=False)
-        output.getvalue()
-        output.seek(0)
-        return output
+        self.copy_rows(
+            df.itertuples(index=False, name=None),
+            table=table,
+            schema=schema,
+            columns=[self._replace_bad_chars(c) for c in df.columns],
+            binary=False
+        )
 
-    def fill_table(self, df, schema, table, echo: bool = True):
+    def copy_rows(self, rows: Iterable[tuple], table: str = None, schema: str = None,
+                  columns: List[str] = None, types: List[str] = None, model=None,
+                  binary: bool = True, chunk_rows: int = COPY_CHUNK_ROWS,
+                  connection=None) -> dict:
+        """
+        Laad rijen uit een iterator met COPY ... FROM STDIN, in blokken van chunk_rows.
 
-        schema_table = '{0}.{1}'.format(schema, table) \
-                       if schema is not None else table
+        model:
+            declarative class (Bases.py); tabel, schema, kolommen en types worden daaruit afgeleid
 
-        if self.engine is None:
-            self.engine = self._create_pg_engine(echo)
+        columns:
+            kolomnamen in de volgorde van de rijen (standaard alle kolommen van het model
+            behalve de autoincrement primary key)
 
-        with self.engine.connect() as conn:
-            cur = conn.connection.cursor()
-            with self._create_io_from_data(df) as f:
-                cur.copy_from(f, schema_table, null='', sep=';')
-            conn.connection.commit()
-            conn.close()
+        types:
+            postgres type per kolom voor binary format ('int4', 'int8', 'float8', 'numeric',
+            'text', 'date', 'timestamp', 'bool'); standaard afgeleid uit het model
+
+        binary:
+            binary COPY format, anders csv (dan zijn geen types nodig)
+
+        connection:
+            bestaande DBAPI connectie (geen commit), anders een nieuwe connectie met commit
+
+        Geeft {'rows', 'seconds', 'rows_per_sec', 'bytes'} terug.
+        """
+        if model is not None:
+            sa_table = model.__table__
+            table = table or sa_table.name
+            schema = schema if schema is not None else sa_table.schema
+
+            if columns is None:
+                columns = [c.name for c in sa_table.columns if not (c.primary_key and c.autoincrement)]
+            if types is None:
+                types = [pg_type(sa_table.columns[c].type) for c in columns]
+
+        if columns is None:
+            raise ValueError('Geef columns of model op.')
+        if binary and types is None:
+            raise ValueError('Binary COPY heeft types (of een model) nodig.')
+
+        schema_table = '.'.join(quote_ident(n) for n in (schema, table) if n is not None)
+        cols = ', '.join(quote_ident(c) for c in columns)
+        fmt = 'FORMAT binary' if binary else "FORMAT csv, DELIMITER ';', NULL ''"
+        sql = f'COPY {schema_table} ({cols}) FROM STDIN WITH ({fmt})'
+
+        stats = {'rows': 0, 'bytes': 0}
+
+        def counted(it: Iterable[tuple]) -> Iterator[tuple]:
+            for row in it:
+                stats['rows'] += 1
+                yield row
+
+        if binary:
+            chunks = binary_chunks(counted(rows), [BINARY_ENCODERS[t] for t in types], chunk_rows)
+        else:
+            chunks = csv_chunks(counted(rows), chunk_rows)
+
+        stream = ChunkStream(chunks)
+        start = time.perf_counter()
+
+        if connection is not None:
+            connection.cursor().copy_expert(sql, stream)
+
+        else:
+            if self.engine is None:
+                self.engine = self._create_pg_engine(False)
 
-        print('Filled: {0}'.format(schema_table))
+            conn = self.engine.raw_connection()
+            try:
+                conn.cursor().copy_expert(sql, stream)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+        seconds = time.perf_counter() - start
+        observe('db.copy', seconds, schema_table)
+        incr('db.rows', stats['rows'])
+        stats.update(bytes=stream.bytes_read, seconds=seconds, rows_per_sec=stats['rows'] / seconds if seconds else 0)
+
+        print('Filled: {0} ({1} rijen, {2:.1f} s, {3:.0f} rijen/s, {4:.1f} MB)'.format(
+            schema_table, stats['rows'], seconds, stats['rows_per_sec'], stats['bytes'] / 1e6))
+        return stats
 
     @staticmethod
     def _replace_bad_chars(line: str) -> str:
@@ -129,3 +215,289 @@ class Psql:
         """Execute sql statement on current engine."""
         from sqlalchemy import text
         self.engine.execute(text(sql).execution_options(autocommit=True))
+
+    def upsert(self, rows: Iterable[tuple], model, key: List[str], columns: List[str] = None,
+               history=None, updated_column: str = 'bijgewerkt', keep: List[str] = None,
+               connection=None) -> dict:
+        """
+        Voeg rijen samen met de tabel van model: nieuwe rijen toevoegen, alleen gewijzigde rijen bijwerken.
+
+        De rijen worden eerst via COPY in een tijdelijke staging tabel geladen.
+
+        key:
+            kolommen waarop gematcht wordt (moeten een unique constraint hebben)
+
+        history:
+            declarative class waarin de oude versie van elke gewijzigde rij wordt vastgelegd
+            (zelfde kolommen als model, plus 'gewijzigd')
+
+        updated_column:
+            kolom die bij toevoegen/wijzigen op now() gezet wordt (als de tabel hem heeft)
+
+        keep:
+            kolommen die alleen bij toevoegen geschreven worden en niet meetellen als wijziging
+            (bijv. de datum waarop een rij voor het eerst gezien is)
+
+        Geeft de copy statistieken plus {'upserted', 'history'} terug.
+        """
+        sa_table = model.__table__
+        target = '.'.join(quote_ident(n) for n in (sa_table.schema, sa_table.name) if n is not None)
+
+        if columns is None:
+            columns = [c.name for c in sa_table.columns
+                       if not (c.primary_key and c.autoincrement) and c.name != updated_column]
+
+        types = [pg_type(sa_table.columns[c].type) for c in columns]
+        compare = [c for c in columns if c not in key and c not in (keep or [])]
+        staging = quote_ident(f'stg_{sa_table.name.lower()}')
+
+        cols = ', '.join(quote_ident(c) for c in columns)
+        keys = ', '.join(quote_ident(c) for c in key)
+        on_key = ' AND '.join(f't.{quote_ident(c)} = s.{quote_ident(c)}' for c in key)
+
+        def row(alias: str, names: List[str]) -> str:
+            return '(' + ', '.join(f'{alias}.{quote_ident(c)}' for c in names) + ')'
+
+        changed = f"{row('t', compare)} IS DISTINCT FROM {row('s', compare)}" if compare else 'FALSE'
+        source = f'SELECT DISTINCT ON ({keys}) {cols} FROM {staging}'
+
+        if self.engine is None:
+            self.engine = self._create_pg_engine(False)
+
+        conn = connection if connection is not None else self.engine.raw_connection()
+
+        try:
+            start = time.perf_counter()
+            cur = conn.cursor()
+            cur.execute(f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {cols} FROM {target} WITH NO DATA')
+            stats = self.copy_rows(rows, table=staging.strip('"'), columns=columns, types=types, connection=conn)
+
+            stats['history'] = 0
+            if history is not None:
+                hist_cols = [c.name for c in history.__table__.columns
+                             if c.name in sa_table.columns and not c.primary_key]
+                hist_table = '.'.join(
+                    quote_ident(n) for n in (history.__table__.schema, history.__table__.name) if n is not None
+                )
+                cur.execute(
+                    f"INSERT INTO {hist_table} ({', '.join(quote_ident(c) for c in hist_cols)}, {quote_ident('gewijzigd')}) "
+                    f"SELECT {', '.join(f't.{quote_ident(c)}' for c in hist_cols)}, now() "
+                    f"FROM {target} t JOIN ({source}) s ON {on_key} WHERE {changed}"
+                )
+                stats['history'] = cur.rowcount
+
+            insert_cols, select_cols = cols, cols
+            set_cols = [f'{quote_ident(c)} = EXCLUDED.{quote_ident(c)}' for c in compare]
+
+            if updated_column in sa_table.columns:
+                insert_cols += f', {quote_ident(updated_column)}'
+                select_cols += ', now()'
+                set_cols.append(f'{quote_ident(updated_column)} = now()')
+
+            conflict = (
+                f"DO UPDATE SET {', '.join(set_cols)} "
+                f"WHERE {row('t', compare)} IS DISTINCT FROM {row('EXCLUDED', compare)}"
+            ) if compare else 'DO NOTHING'
+
+            cur.execute(
+                f'INSERT INTO {target} AS t ({insert_cols}) '
+                f'SELECT {select_cols} FROM ({source}) s '
+                f'ON CONFLICT ({keys}) {conflict}'
+            )
+            stats['upserted'] = cur.rowcount
+
+            if connection is None:
+                conn.commit()
+
+            observe('db.upsert', time.perf_counter() - start, target)
+
+        except Exception:
+            if connection is None:
+                conn.rollback()
+            raise
+
+        finally:
+            if connection is None:
+                conn.close()
+
+        print('Upsert: {0} ({1} nieuw/gewijzigd, {2} in historie)'.format(
+            target, stats['upserted'], stats['history']))
+        return stats
+
+
+def quote_ident(name: str) -> str:
+    return '"{0}"'.format(str(name).replace('"', '""'))
+
+
+def pg_type(sa_type) -> str:
+    """Postgres binary type voor een sqlalchemy kolom type."""
+    if isinstance(sa_type, Float):
+        return 'float8'
+    if isinstance(sa_type, Numeric):
+        return 'numeric'
+    if isinstance(sa_type, BigInteger):
+        return 'int8'
+    if isinstance(sa_type, SmallInteger):
+        return 'int2'
+    if isinstance(sa_type, Integer):
+        return 'int4'
+    if isinstance(sa_type, DateTime):
+        return 'timestamp'
+    if isinstance(sa_type, Date):
+        return 'date'
+    if isinstance(sa_type, Boolean):
+        return 'bool'
+    return 'text'
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+
+def _encode_numeric(value) -> bytes:
+    """Postgres numeric binary format: ndigits, weight, sign, dscale, base-10000 digits."""
+    dec = value if isinstance(value, Decimal) else Decimal(str(value))
+
+    if dec.is_nan():
+        return struct.pack('!hhHH', 0, 0, 0xC000, 0)
+
+    # +/-Infinity (numeric kent die sinds Postgres 14)
+    if dec.is_infinite():
+        return struct.pack('!hhHH', 0, 0, 0xF000 if dec.is_signed() else 0xD000, 0)
+
+    sign, digits, exp = dec.as_tuple()
+    digits = ''.join(map(str, digits))
+
+    if exp >= 0:
+        int_part, frac_part = digits + '0' * exp, ''
+    else:
+        point = len(digits) + exp
+        int_part = digits[:point] if point > 0 else ''
+        frac_part = ('0' * -point if point < 0 else '') + digits[max(point, 0):]
+
+    int_part = int_part.zfill((len(int_part) + 3) // 4 * 4)
+    frac_part = frac_part.ljust((len(frac_part) + 3) // 4 * 4, '0')
+
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+
+    if not groups:
+        weight = 0
+
+    return struct.pack(f'!hhHH{len(groups)}H', len(groups), weight, 0x4000 if sign else 0,
+                       max(0, -exp), *groups)
+
+
+BINARY_ENCODERS = {
+    'int2': lambda v: struct.pack('!h', int(v)),
+    'int4': lambda v: struct.pack('!i', int(v)),
+    'int8': lambda v: struct.pack('!q', int(v)),
+    'float4': lambda v: struct.pack('!f', float(v)),
+    'float8': lambda v: struct.pack('!d', float(v)),
+    'numeric': _encode_numeric,
+    'text': lambda v: str(v).encode('utf-8'),
+    'date': lambda v: struct.pack('!i', (_as_date(v) - PG_EPOCH).days),
+    'timestamp': lambda v: struct.pack(
+        '!q', (_as_datetime(v) - PG_EPOCH_TS) // PG_EPOCH_TS.resolution),
+    'bool': lambda v: b'\x01' if v else b'\x00',
+}
+
+_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+_BINARY_TRAILER = struct.pack('!h', -1)
+_NULL = struct.pack('!i', -1)
+
+
+def _is_null(value) -> bool:
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def binary_chunks(rows: Iterable[tuple], encoders: List[Callable], chunk_rows: int) -> Iterator[bytes]:
+    """Codeer rijen in het binary COPY format, per blok van chunk_rows rijen."""
+    field_count = struct.pack('!h', len(encoders))
+    buf = bytearray(_BINARY_HEADER)
+    count = 0
+
+    for row in rows:
+        buf += field_count
+
+        for enc, value in zip(encoders, row):
+            if _is_null(value):
+                buf += _NULL
+            else:
+                data = enc(value)
+                buf += struct.pack('!i', len(data))
+                buf += data
+
+        count += 1
+        if count >= chunk_rows:
+            yield bytes(buf)
+            buf, count = bytearray(), 0
+
+    buf += _BINARY_TRAILER
+    yield bytes(buf)
+
+
+def csv_chunks(rows: Iterable[tuple], chunk_rows: int) -> Iterator[bytes]:
+    """Codeer rijen als csv (';' gescheiden, lege waarde = NULL), per blok van chunk_rows rijen."""
+    out = StringIO()
+    writer = csv.writer(out, delimiter=';', lineterminator='\n')
+    count = 0
+
+    for row in rows:
+        writer.writerow(['' if _is_null(v) else v for v in row])
+        count += 1
+
+        if count >= chunk_rows:
+            yield out.getvalue().encode('utf-8')
+            out.seek(0)
+            out.truncate()
+            count = 0
+
+    if out.tell():
+        yield out.getvalue().encode('utf-8')
+
+
+class ChunkStream:
+    """File-achtig object dat COPY (copy_expert) laat lezen uit een generator van blokken."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buf = b''
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buf) < size:
+            try:
+                self._buf += next(self._chunks)
+            except StopIteration:
+                break
+
+        if size < 0:
+            data, self._buf = self._buf, b''
+        else:
+            data, self._buf = self._buf[:size], self._buf[size:]
+
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.read(size)
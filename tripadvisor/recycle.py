@@ -0,0 +1,93 @@
+"""
+Automatisch herstarten van een browser bij te veel geheugen of pagina's.
+
+Chrome lekt geheugen bij lange runs. Een browser wordt herstart als het RSS van
+chromedriver + chrome processen boven max_rss_mb komt, of na max_pages pagina's.
+
+Standaard drempels via TRIPADVISOR_RECYCLE_PAGES en TRIPADVISOR_RECYCLE_MB (0 = uit).
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import os
+from typing import Iterable
+
+import psutil
+
+MAX_PAGES = 1000
+MAX_RSS_MB = 2048
+CHECK_EVERY = 10
+RETRIES = 1
+
+
+class RecyclePolicy:
+    """
+    Drempels voor het herstarten van een browser.
+
+    max_pages:
+        herstart na zoveel pagina's sinds de vorige start (0 = geen limiet)
+
+    max_rss_mb:
+        herstart als het RSS van de proces boom hierboven komt (0 = geen limiet)
+
+    check_every:
+        meet het RSS elke zoveel pagina's (psutil over alle processen is niet gratis)
+
+    retries:
+        zo vaak wordt een pagina opnieuw geprobeerd na een herstart door een vastgelopen browser
+    """
+
+    max_pages: int
+    max_rss_mb: float
+    check_every: int
+    retries: int
+
+    def __init__(self, max_pages: int = MAX_PAGES, max_rss_mb: float = MAX_RSS_MB,
+                 check_every: int = CHECK_EVERY, retries: int = RETRIES):
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.check_every = max(1, check_every)
+        self.retries = retries
+
+    def __repr__(self):
+        return f'RecyclePolicy(max_pages={self.max_pages}, max_rss_mb={self.max_rss_mb})'
+
+    def check_rss(self, pages: int) -> bool:
+        return bool(self.max_rss_mb) and pages > 0 and pages % self.check_every == 0
+
+    def reason(self, pages: int, rss_mb: float = None) -> str:
+        """Reden om te herstarten ('pages' of 'rss'), of een lege string."""
+        if self.max_pages and pages >= self.max_pages:
+            return 'pages'
+        if rss_mb is not None and self.max_rss_mb and rss_mb >= self.max_rss_mb:
+            return 'rss'
+        return ''
+
+
+_policy = RecyclePolicy(
+    max_pages=int(os.environ.get('TRIPADVISOR_RECYCLE_PAGES', MAX_PAGES)),
+    max_rss_mb=float(os.environ.get('TRIPADVISOR_RECYCLE_MB', MAX_RSS_MB))
+)
+
+
+def set_policy(policy: RecyclePolicy):
+    """Kies de standaard drempels voor browsers zonder eigen policy."""
+    global _policy
+    _policy = policy
+
+
+def get_policy() -> RecyclePolicy:
+    return _policy
+
+
+def rss_mb(procs: Iterable[psutil.Process]) -> float:
+    """Totaal RSS in MB van een aantal processen (verdwenen processen tellen niet mee)."""
+    total = 0
+
+    for proc in procs:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+
+    return total / 1024 / 1024
@@ -6,20 +6,24 @@ Scrape categorieën.
 """
 import re
 from datetime import datetime as dt
-from itertools import chain
-from time import sleep
+from typing import Iterable
 
 import bs4
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.support.ui import WebDriverWait
 
 from tripadvisor.browser import Browser, hide_elements, scroll_into_view
+from tripadvisor.fixtures import record_page, recording
+from tripadvisor.parser import parse
+from tripadvisor.scrape_3 import URL
+from tripadvisor.waits import waits
 
-URL = 'https://www.tripadvisor.com'
-URL_NH = f'{URL}/Attractions-g188587-Activities-North_Holland_Province.html'
-URL_FL = f'{URL}/Attractions-g188559-Activities-Flevoland_Province.html'
+# provincie -> attracties pagina; een provincie toevoegen is genoeg om hem mee te scrapen
+PROVINCES = {
+    'Noord-Holland': f'{URL}/Attractions-g188587-Activities-North_Holland_Province.html',
+    'Flevoland': f'{URL}/Attractions-g188559-Activities-Flevoland_Province.html',
+}
 
 XPATH_VIEW_MORE_BUTTON = "//span[@class='_3S09qsQh _1dTP6k0z _30GXgBoj']"
 XPATH_VIEW_MORE_BUTTON_NL = ("Alles weergeven", "Minder weergeven")
@@ -39,7 +43,8 @@ def get_categories_prov(browser: Browser) -> bs4.ResultSet:
             locator=(By.XPATH, XPATH_VIEW_MORE_BUTTON),
             text_=XPATH_VIEW_MORE_BUTTON_EN[1]
         )
-        WebDriverWait(browser.driver, 2).until(element_present)
+        if not waits.until(browser.driver, 'categories', 'view_more', element_present, 2):
+            raise TimeoutException('Alle categorieën niet uitgeklapt')
 
     except TimeoutException as t:
         raise t
@@ -47,12 +52,12 @@ def get_categories_prov(browser: Browser) -> bs4.ResultSet:
         raise e
 
     else:
-        cat = bs4.BeautifulSoup(
-            browser.driver.page_source,
-            features='lxml'
-        ).find_all('a', {'class': CATEGORY_LINK_CLASS})
+        source = browser.driver.page_source
+        if recording():
+            record_page(browser.driver.current_url, source)
+
+        cat = parse(source).find_all('a', {'class': CATEGORY_LINK_CLASS})
 
-    sleep(2)
     return cat
 
 
@@ -66,13 +71,24 @@ def get_data_from_item(item: bs4.Tag, provincie: str) -> tuple:
     )
 
 
-def get_categories(browser: Browser) -> list:
-    """Return categorieën lijst."""
-    browser.get(URL_NH)
-    nh = (get_data_from_item(item, 'Noord-Holland') for item in get_categories_prov(browser))
+def check_provincies(provincies: Iterable[str]) -> list:
+    """Return provincies als lijst; ValueError als er een niet in PROVINCES staat."""
+    provincies = list(provincies)
+    unknown = [p for p in provincies if p not in PROVINCES]
+
+    if unknown:
+        raise ValueError(f'Onbekende provincie(s): {", ".join(unknown)} (kies uit: {", ".join(PROVINCES)})')
+
+    return provincies
+
+
+def get_categories(browser: Browser, provincies: Iterable[str] = None) -> list:
+    """Return categorieën lijst (standaard van alle PROVINCES)."""
+    categories = []
 
-    browser.get(URL_FL)
-    fl = (get_data_from_item(item, 'Flevoland') for item in get_categories_prov(browser))
+    for provincie in check_provincies(provincies or PROVINCES):
+        browser.get(PROVINCES[provincie])
+        categories.extend(get_data_from_item(item, provincie) for item in get_categories_prov(browser))
 
-    return [item for item in chain(nh, fl)]
+    return categories
 
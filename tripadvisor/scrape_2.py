@@ -4,19 +4,26 @@ Scrape links naar attracties.
 @author: Roel de Vries
 @email: roel.de.vries@amsterdam.nl
 """
+import heapq
+import math
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as dt
-from time import sleep
+from typing import Iterable, Iterator, List
 
 import bs4
-from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.support.ui import WebDriverWait
 
-from tripadvisor.browser import Browser, scroll_into_view
+from tripadvisor.browser import Browser, ChromeBrowser, scroll_into_view
+from tripadvisor.fetch import HttpResponse
+from tripadvisor.fixtures import record_page, recording
+from tripadvisor.metrics import incr
+from tripadvisor.parser import parse, class_prefix
+from tripadvisor.scrape_3 import URL, extract_integer
+from tripadvisor.waits import waits
 
-BASE = 'https://www.tripadvisor.com'
+BASE = URL
 
 XPATH_NEXT_BUTTON_1 = "//a[@class='nav next rndBtn ui_button primary taLnk']"
 XPATH_NEXT_BUTTON_2 = "//a[@class='ui_button nav next primary ']"
@@ -29,22 +36,26 @@ XPATH_LISTING_TITLE_SPACE = "//div[@class='listing_title ']/a"
 
 LOC_CATEGORY_ITEM = 'attractions-attraction-filtered-main-index__listItem--3trCl'
 
+PAGE_SIZE = 30
+NEXT_PAGE_WAIT = 5
+FETCH_WORKERS = 8
 
-def _wait_for(driver, elem: str):
-    try:
-        element_present = ec.presence_of_element_located((By.XPATH, elem))
-        WebDriverWait(driver, 1).until(element_present)
-    except TimeoutException:
+
+def _wait_for(driver, elem: str, name: str = 'next_button', default: float = 1):
+    element_present = ec.presence_of_element_located((By.XPATH, elem))
+
+    if not waits.until(driver, 'listing', name, element_present, default):
         print('Timed out waiting for page to load')
 
 
-def get_provincie_from_url(url_str: str) -> str:
-    if 'North_Holland' in url_str:
-        return 'Noord-Holland'
-    elif 'Flevoland' in url_str:
-        return 'Flevoland'
-    else:
-        return ''
+def _first_listing(driver):
+    """Eerste resultaat op de pagina (of de body), om te zien wanneer de pagina vervangen is."""
+    for xpath in (XPATH_LISTING_TITLE, XPATH_LISTING_TITLE_SPACE, f"//*[@class='{LOC_CATEGORY_ITEM}']"):
+        elements = driver.find_elements_by_xpath(xpath)
+        if elements:
+            return elements[0]
+
+    return driver.find_element_by_tag_name('body')
 
 
 def strip_link(js_link: str) -> str:
@@ -67,7 +78,7 @@ def find_link(bs_obj: bs4.Tag) -> str:
 
 
 def find_price(bs_obj: bs4.Tag) -> float:
-    from scrape_3 import extract_float
+    from tripadvisor.scrape_3 import extract_float
 
     price = bs_obj.find('div', {'class', 'attractions-ap-product-card-Attributes__priceFrom--2jhVp'})
 
@@ -82,12 +93,24 @@ def find_price(bs_obj: bs4.Tag) -> float:
     return extract_float(price)
 
 
+def find_listing_reviews(bs_obj: bs4.Tag) -> int:
+    """Aantal reviews zoals zichtbaar op de listing kaart (-1 als het er niet op staat)."""
+    match = re.search(r'([0-9][0-9,.]*)\s+reviews?\b', bs_obj.get_text(' '), re.IGNORECASE)
+    return extract_integer(match.group(1)) if match else -1
+
+
 def find_title(bs_obj: bs4.Tag) -> str:
-    title = bs_obj.find('a')
-    return bs_obj.get_text(strip=True) if title else '< GEEN TITEL >'
+    """Tekst van de eerste link met tekst (de eerste link is vaak de foto), niet de hele kaart."""
+    for a in bs_obj.find_all('a'):
+        title = a.get_text(strip=True)
+        if title:
+            return title
+
+    return '< GEEN TITEL >'
 
 
-def get_links(soup: bs4.BeautifulSoup, link: str) -> list:
+def get_links(soup: bs4.BeautifulSoup, link: str, provincie: str = '') -> list:
+    """Attractie records van een listing pagina; provincie komt uit de categorie (category[4])."""
     return [
         (
             find_title(i),
@@ -95,11 +118,12 @@ def get_links(soup: bs4.BeautifulSoup, link: str) -> list:
             find_link(i.find('a')),  # link to attractie
             dt.now().date(),
             'NEW',
-            get_provincie_from_url(link),
-            link
+            provincie,
+            link,
+            find_listing_reviews(i)
         )
         for i in soup.find_all('div', {'class': [
-                lambda x: str(x).startswith('attractions-ap-product-card-ProductCard__productCard'),
+                class_prefix('attractions-ap-product-card-ProductCard__productCard'),
                 'attraction_element'
             ]
         })
@@ -122,7 +146,11 @@ def get_activities(category: tuple, browser: Browser) -> tuple:
             browser
         )
 
-        data = get_links(bs4.BeautifulSoup(browser.driver.page_source, features='lxml'), link)
+        source = browser.driver.page_source
+        if recording():
+            record_page(browser.driver.current_url, source)
+
+        data = get_links(parse(source), link, category[4])
 
         for i in data:
             yield i
@@ -142,10 +170,118 @@ def get_activities(category: tuple, browser: Browser) -> tuple:
 
         if not button_disabled and (next_button_enabled1 or next_button_enabled2):
             _wait_for(browser.driver, next_button)
+
+            # wacht tot de vorige resultaten vervangen zijn in plaats van een vaste sleep
+            old_listing = _first_listing(browser.driver)
             browser.driver.find_element_by_xpath(next_button).click()
-            sleep(1)
+            waits.until(browser.driver, 'listing', 'next_page', ec.staleness_of(old_listing), NEXT_PAGE_WAIT)
 
             print(f'CLICK...   (pagina {page_counter})')
 
         else:
             break
+
+
+def offset_url(link: str, offset: int) -> str:
+    """Link naar de categorie pagina die begint bij offset (bijv. ...-Activities-c42-oa30-...)."""
+    link = re.sub(r'-oa[0-9]+', '', link)
+
+    if offset <= 0:
+        return link
+
+    return re.sub(r'(-Activities(?:-c[0-9]+)?(?:-t[0-9]+)?)', rf'\1-oa{offset}', link, count=1)
+
+
+def find_page_offsets(soup, page_size: int = PAGE_SIZE) -> List[int]:
+    """Offsets van alle volgende pagina's, gelezen uit de paginering van de eerste pagina."""
+    pages = soup.find_all('a', {'data-page-number': True})
+    numbers = [extract_integer(p.get('data-page-number')) for p in pages]
+    offsets = [extract_integer(p.get('data-offset')) for p in pages]
+
+    step = min((o for o in offsets if o > 0), default=page_size)
+    last = max(numbers, default=0)
+
+    if last <= 1:
+        total = find_total_results(soup)
+        last = math.ceil(total / step) if total > 0 else 1
+
+    return [step * (n - 1) for n in range(2, last + 1)]
+
+
+def find_total_results(soup) -> int:
+    """Totaal aantal resultaten uit tekst zoals '1-30 of 456 results' (-1 als onbekend)."""
+    match = re.search(r'of\s+([0-9,.]+)\s+(?:results|things to do)', soup.get_text(' '), re.IGNORECASE)
+    return extract_integer(match.group(1)) if match else -1
+
+
+def fetch_listing(url: str, browser: ChromeBrowser = None):
+    """Haal een listing pagina op via http, of via de browser als die gegeven is."""
+    if browser is not None:
+        browser.get(url, ignore_errors=True)
+        source = browser.driver.page_source
+        record_page(url, source)
+        return parse(source)
+
+    response = HttpResponse(url)
+    response.get_response()
+    response.create_soup()
+    return response.soup
+
+
+def in_page_order(results: Iterable[tuple]) -> Iterator:
+    """Geef (index, waarde) paren, in willekeurige volgorde binnengekomen, terug op volgorde van index."""
+    heap, expected = [], 0
+
+    for idx, value in results:
+        heapq.heappush(heap, (idx, id(value), value))
+
+        while heap and heap[0][0] == expected:
+            yield heapq.heappop(heap)[2]
+            expected += 1
+
+
+def get_activities_paged(category: tuple, browser: Browser = None, pool=None,
+                         workers: int = FETCH_WORKERS) -> Iterator[tuple]:
+    """
+    Return attractie links van alle pagina's van een categorie.
+
+    De eerste pagina geeft het aantal pagina's; de overige pagina's worden direct via hun
+    offset url opgehaald, tegelijk via http (of verdeeld over de BrowserPool als pool gegeven is).
+    Resultaten komen terug in volgorde van de pagina's. Als de pagina's niet via http op te halen
+    zijn wordt teruggevallen op get_activities (klikken op 'next'); een losse pagina die via http
+    mislukt wordt met de browser opgehaald.
+    """
+    link = category[1]
+    first = fetch_listing(BASE + link)
+    data = get_links(first, link, category[4]) if first is not None else []
+
+    if not data:
+        print(f'Geen resultaten via http, terug naar browser: {link}')
+        yield from get_activities(category, browser or Browser())
+        return
+
+    yield from data
+
+    urls = [BASE + offset_url(link, offset) for offset in find_page_offsets(first)]
+    print(f'{len(urls) + 1} pagina\'s: {link}')
+
+    if pool is not None:
+        def fetch_page(b: ChromeBrowser, item: tuple) -> tuple:
+            return item[0], get_links(fetch_listing(item[1], b), link, category[4])
+
+        pages = in_page_order(pool.map(fetch_page, enumerate(urls)))
+
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for url, soup in zip(urls, executor.map(fetch_listing, urls)):
+                # een mislukte pagina niet overslaan, anders wordt de categorie onvolledig afgerond
+                if soup is None:
+                    print(f'Pagina niet via http, terug naar browser: {url}')
+                    incr('listing.fallback', url=url)
+                    soup = fetch_listing(url, browser or Browser())
+
+                yield from get_links(soup, link, category[4])
+        return
+
+    for page in pages:
+        yield from page
@@ -1,13 +1,23 @@
 import json
+import os
 import re
-from typing import Any, Optional
+from typing import Any, List, NamedTuple, Optional, Union
 from urllib.parse import parse_qs, urlparse, ParseResult
 
-from shapely.geometry import Point
+import bs4
 
-from tripadvisor.browser import Response
+from tripadvisor.blocking import STYLES, blocks, styles_profile
+from tripadvisor.browser import ChromeBrowser, Response
+from tripadvisor.fetch import HttpResponse
+from tripadvisor.metrics import incr, timer
+from tripadvisor.parser import parse
+from tripadvisor.waits import waits
 
-URL = 'https://www.tripadvisor.com'
+# TRIPADVISOR_BASE_URL: bijv. een FixtureServer (fixtures.py) voor een offline run
+URL = os.environ.get('TRIPADVISOR_BASE_URL', 'https://www.tripadvisor.com').rstrip('/')
+
+# time-out (s) van de waits op een attractie pagina, tot er genoeg metingen zijn (zie waits)
+WAIT_DEFAULT = 1
 
 
 def find_value_nested_dict(key: Any, dct: dict) -> Optional[Any]:
@@ -50,8 +60,114 @@ def extract_phonenr(line: str) -> str:
     return re.sub(r'[^+0-9]', '', line)
 
 
+class AttractiePage:
+    """
+    Document model van een attractie pagina, één keer opgebouwd per response.
+
+    Het ld+json script wordt één keer gedecodeerd naar een platte key index en de soup wordt
+    één keer doorlopen voor de kaart afbeelding en de review spans.
+    """
+
+    CLS_TITLE = 'IKwHbf8J'
+    CLS_REVIEW_COUNT = '_82HNRypW'
+    CLS_REVIEWS = 'location-review-review-list-parts-ReviewRatingFilter__row_num--3cSP7'
+    CLS_REVIEWS_ALT = 'eqh_0ztw'
+
+    details: dict
+    map_src: Optional[str]
+    title_span: Optional[bs4.Tag]
+    review_count_span: Optional[bs4.Tag]
+    reviews: List[bs4.Tag]
+
+    def __init__(self, soup: Optional[bs4.BeautifulSoup]):
+        self.details = {}
+        self.map_src = None
+        self.title_span = None
+        self.review_count_span = None
+        self.reviews = []
+
+        if soup is not None:
+            self._index(soup)
+
+    @classmethod
+    def from_html(cls, html: str):
+        """Bouw het model uit opgeslagen html (bijv. bij het opnieuw verwerken van pagina's)."""
+        return cls(parse(html))
+
+    def get(self, key: Any) -> Optional[Any]:
+        return self.details.get(key)
+
+    def _index(self, soup: bs4.BeautifulSoup):
+        script = None
+        maps, data_maps = None, None
+        reviews, reviews_alt = [], []
+
+        for tag in soup.find_all(['script', 'img', 'span']):
+            if tag.name == 'script':
+                if script is None and tag.get('type') == 'application/ld+json':
+                    script = tag
+
+            elif tag.name == 'img':
+                src = tag.get('src')
+
+                if src is None:
+                    continue
+                if maps is None and src.startswith('https://maps'):
+                    maps = src
+                elif data_maps is None and src.startswith('/data/1.0/maps'):
+                    data_maps = src
+
+            else:
+                classes = tag.get('class') or []
+
+                if self.CLS_REVIEWS in classes:
+                    reviews.append(tag)
+                if self.CLS_REVIEWS_ALT in classes:
+                    reviews_alt.append(tag)
+                if self.title_span is None and self.CLS_TITLE in classes:
+                    self.title_span = tag
+                if self.review_count_span is None and self.CLS_REVIEW_COUNT in classes:
+                    self.review_count_span = tag
+
+        self.details = self._flatten_script(script)
+        self.map_src = maps if maps else (urlparse(data_maps).query if data_maps else None)
+        self.reviews = reviews or reviews_alt
+
+    @staticmethod
+    def _flatten_script(script: Optional[bs4.Tag]) -> dict:
+        """Zelfde opzoeklogica als find_value_nested_dict, maar voor alle keys tegelijk."""
+        try:
+            dct = json.loads(script.string)
+        except (TypeError, AttributeError, ValueError):
+            return {}
+
+        if not isinstance(dct, dict):
+            return {}
+
+        flat = {}
+        for value in dct.values():
+            if isinstance(value, dict):
+                for k, v in value.items():
+                    flat.setdefault(k, v)
+
+        flat.update((k, v) for k, v in dct.items() if v)
+        return flat
+
+
+class Coords(NamedTuple):
+    x: float  # lon
+    y: float  # lat
+
+
 class Attractie:
-    _response: Response
+    # alleen de gevonden velden blijven bewaard; response en soup worden na het zoeken losgelaten
+    __slots__ = (
+        '_response', '_page', '_tripadvisor_id', '_title', '_straat', '_postcode', '_plaats',
+        '_country', '_coords', '_rating', '_aantal_reviews', '_reviews', '_link'
+    )
+
+    _response: Optional[Union[Response, HttpResponse]]
+    _page: Optional[AttractiePage]
 
     _xpath_staticmap_element: str = "//img[contains(@src, 'maps.google')]"
     _tripadvisor_id: int
@@ -60,15 +176,31 @@ class Attractie:
     _postcode: str
     _plaats: str
     _country: str
-    _coords: Point
+    _coords: Coords
     _rating: float
     _aantal_reviews: int
     _reviews: list
     _link: ParseResult
 
-    def __init__(self, link: str, headless: bool = True):
+    def __init__(self, link: str, headless: bool = True, browser: ChromeBrowser = None, blocking: str = None,
+                 engine: str = 'browser', response: Response = None):
+        """
+        engine:
+            'browser' haalt de pagina op met chrome, 'http' probeert eerst een gewone GET en valt
+            alleen terug op chrome als er verplichte velden ontbreken
+
+        response:
+            pagina die al in de actieve tab geladen is (tabs.TabPool), er wordt niet genavigeerd
+        """
         self.link = link
-        self.get_attractie(headless=headless)
+
+        if response is not None:
+            self.from_response(response)
+            self.find_all()
+        else:
+            self.get_attractie(headless=headless, browser=browser, blocking=blocking, engine=engine)
+
+        self.release()
 
     def __repr__(self):
         return f"Titel: {self.title}\n" \
@@ -101,6 +233,10 @@ class Attractie:
     def response(self):
         return self._response
 
+    @property
+    def page(self) -> AttractiePage:
+        return self._page
+
     @property
     def title(self) -> str:
         return self._title
@@ -158,7 +294,7 @@ class Attractie:
         self._aantal_reviews = extract_integer(value)
 
     @property
-    def coords(self) -> Point:
+    def coords(self) -> Coords:
         return self._coords
 
     @coords.setter
@@ -168,7 +304,7 @@ class Attractie:
             lat = extract_float(value[1])
         except (IndexError, TypeError):
             lat, lon = -1, -1
-        self._coords = Point(lon, lat)
+        self._coords = Coords(lon, lat)
 
     @property
     def country(self) -> str:
@@ -206,7 +342,6 @@ class Attractie:
         if len(attrac) != 17:
             print('Warning: attractie != 17')
 
-        self.print_()
         return attrac
 
     def print_(self):
@@ -219,34 +354,71 @@ class Attractie:
             f"link={self.link.path})"
          )
 
-    def from_link(self, headless: bool = True):
-        self._response = Response(self.link.geturl(), headless=headless, init=True)
+    def release(self):
+        """Laat response, page source en soup los; alleen de gevonden velden blijven over."""
+        self._response = None
+        self._page = None
+
+    def from_link(self, headless: bool = True, browser: ChromeBrowser = None, blocking: str = None):
+        self._response = Response(
+            self.link.geturl(), headless=headless, init=True, browser=browser, blocking=blocking
+        )
+
+        self._read_page(navigate=True)
+
+    def from_response(self, response: Response):
+        self._response = response
+        self._read_page(navigate=False)
+
+    def _read_page(self, navigate: bool):
+        named = {'staticmap': self._xpath_staticmap_element, 'review_count': "//span[@class='_82HNRypW']"}
+        wait = waits.plan('attractie', named, default=WAIT_DEFAULT)
+
+        if navigate:
+            self.response.get_response(wait_for_elements=wait)
+        else:
+            self.response.complete(wait_for_elements=wait)
 
-        wait = [
-            (self._xpath_staticmap_element, 0.1),  # works: 1, 0.5
-            ("//span[@class='_82HNRypW']", 0.1)  # works: 0.5, 0.25
-        ]
-        self.response.get_response(wait_for_elements=wait)
+        if self.response.page_source is None:
+            raise RuntimeError(f'Pagina niet geladen: {self.link.geturl()}')
+
+        waits.record_all('attractie', named, wait, self.response.waited)
         self.response.create_soup()
 
-    def find_details_in_script_header(self, key: Any) -> dict:
-        try:
-            script = self.response.soup.find('script', {'type': 'application/ld+json'})
-            value = find_value_nested_dict(key, json.loads(script.string)) or {}
+        with timer('parse.page', self.link.path):
+            self._page = AttractiePage(self.response.soup)
 
-        except (TypeError, AttributeError):
-            return {}
+    def from_http(self):
+        self._response = HttpResponse(self.link.geturl())
+        self.response.get_response()
+
+        if self.response.page_source is None:
+            return
+
+        self.response.create_soup()
 
-        return value
+        with timer('parse.page', self.link.path):
+            self._page = AttractiePage(self.response.soup)
+
+    def missing_fields(self) -> List[str]:
+        """Verplichte velden die (nog) niet gevonden zijn."""
+        missing = []
+
+        if not self.title:
+            missing.append('title')
+        if self.aantal_reviews != -1 and self.rating == -1:
+            missing.append('rating')
+
+        return missing
+
+    def find_details_in_script_header(self, key: Any) -> dict:
+        return self.page.get(key) or {}
 
     def find_title(self):
         title = self.find_details_in_script_header('name')
 
-        if not title:
-            try:
-                title = self.response.soup.find('span', {'class': 'IKwHbf8J'}).get_text(strip=True)
-            except AttributeError:
-                pass
+        if not title and self.page.title_span is not None:
+            title = self.page.title_span.get_text(strip=True)
 
         self.title = title
 
@@ -273,12 +445,14 @@ class Attractie:
 
             if not rating:
                 try:
-                    content = self.response.get_css_properties(
+                    # bubbels zijn icon-font tekens in de content van :after
+                    values = self.response.get_css_values(
                         elem=["span.uq1qMUbD._2n4wJlqY", "span.uq1qMUbD._2vB__cbb"],
+                        props=['content'],
                         by='css',
-                        prop="content",
                         pseudo=':after'
                     )
+                    content = [v['content'] for v in values if v is not None]
                     full = [repr(f).count("\\ue129") for f in content]
                     half = [repr(h).count("\\ue12a") * 5 for h in content]  # 0 of 1
                     rating = f'{min(full)}.{max(half)}'
@@ -292,11 +466,8 @@ class Attractie:
     def find_aantal_reviews(self):
         aantal_reviews = self.find_details_in_script_header('reviewCount')
 
-        if not aantal_reviews:
-            try:
-                aantal_reviews = self.response.soup.find('span', {'class': '_82HNRypW'}).get_text()
-            except AttributeError:
-                pass
+        if not aantal_reviews and self.page.review_count_span is not None:
+            aantal_reviews = self.page.review_count_span.get_text()
 
         self.aantal_reviews = aantal_reviews
 
@@ -314,22 +485,8 @@ class Attractie:
         self.country = coun.get('name', None)
 
     def find_coords(self):
-        def find_map(x):
-            return str(x).startswith('https://maps')
-
-        # [i['src'] for i in self.response.soup.find_all('img') if 'src' in i.attrs]
         try:
-            coords = self.response.soup.find('img', {'src': find_map})
-
-            if coords:
-                coords = coords.get('src', None)
-
-            else:
-                imgs = [i['src'] for i in self.response.soup.find_all('img')
-                        if 'src' in i.attrs and i.get('src', '').startswith('/data/1.0/maps')]
-                coords = urlparse(imgs[0]).query if imgs else None
-
-            coords = parse_qs(coords)['center']
+            coords = parse_qs(self.page.map_src)['center']
             coords = str(coords).split(',')
 
         except (AttributeError, IndexError, TypeError, KeyError, ValueError):
@@ -339,31 +496,56 @@ class Attractie:
             self.coords = coords
 
     def find_reviews(self):
-        try:
-            soup = self.response.soup
-            reviews = soup.find_all(
-                'span', {'class': 'location-review-review-list-parts-ReviewRatingFilter__row_num--3cSP7'}
-            )
+        self.reviews = self.page.reviews
 
-            if not reviews:
-                reviews = soup.find_all('span', {'class': 'eqh_0ztw'})
+    def get_attractie(self, headless: bool, browser: ChromeBrowser = None, blocking: str = None,
+                      engine: str = 'browser'):
+        if engine == 'http':
+            self.from_http()
 
-        except AttributeError:
-            self.reviews = []
-
-        else:
-            self.reviews = reviews
-
-    def get_attractie(self, headless: bool):
-        self.from_link(headless=headless)
-
-        self.find_coords()
-        self.find_title()
-        self.find_aantal_reviews()
-        self.find_rating()
-        self.find_adres_straat()
-        self.find_country()
-        self.find_plaats()
-        self.find_postcode()
-        self.find_ta_id()
-        self.find_reviews()
+            # http mislukt: niet opgeven, de browser probeert het nog
+            if self.response.page_source is None:
+                missing = ['pagina']
+            else:
+                self.find_all()
+                missing = self.missing_fields()
+
+            if not missing:
+                return
+
+            print(f'via browser: {self.link.path} (ontbreekt: {", ".join(missing)})')
+            incr('attractie.escalated', url=self.link.path)
+
+            # de rating fallback leest computed styles, daarvoor moet de css geladen worden
+            if 'rating' in missing:
+                blocking = styles_profile(blocking)
+
+        self.from_link(headless=headless, browser=browser, blocking=blocking)
+        self.find_all()
+
+        if 'rating' in self.missing_fields() and blocks(blocking, STYLES):
+            print(f'opnieuw met css: {self.link.path} (ontbreekt: rating)')
+            incr('attractie.restyled', url=self.link.path)
+            self.from_link(headless=headless, browser=browser, blocking=styles_profile(blocking))
+            self.find_all()
+
+    def find_all(self):
+        for find in (
+                self.find_coords,
+                self.find_title,
+                self.find_aantal_reviews,
+                self.find_rating,
+                self.find_adres_straat,
+                self.find_country,
+                self.find_plaats,
+                self.find_postcode,
+                self.find_ta_id,
+                self.find_reviews
+        ):
+            with timer(f'attractie.{find.__name__}', self.link.path):
+                find()
+
+
+def rating_missing(record: tuple) -> bool:
+    """Geen rating gevonden terwijl er wel reviews zijn (record uit Attractie.data)."""
+    return record[9] != -1 and record[4] == -1
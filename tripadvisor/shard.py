@@ -0,0 +1,212 @@
+"""
+Scrape stappen verdeeld over worker processen (shards).
+
+Elke shard draait in een eigen proces met een eigen browser (poort en profiel) en
+schrijft naar een eigen journal in <journal map>/shards. Na afloop worden de journals
+samengevoegd in de journals van de run; attracties ontdubbeld op attrac_url. Metingen
+en geleerde wachttijden van de shards gaan naar metrics en waits van het hoofdproces.
+
+Een gespawnd proces begint met de standaard instellingen; parser backend, recycle drempels
+en het waits bestand gaan mee via shard_settings() (als keyword argument van de workers).
+
+    categorieën:  per provincie
+    activities:   per categorie
+    attracties:   per link (elke link maar in één shard, ook als hij in meerdere categorieën staat)
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, List, Optional, Sequence
+
+from tripadvisor.browser import ChromeBrowser
+from tripadvisor.journal import Journal, activity_key, attractie_key, category_key, dead_letter_key
+from tripadvisor.metrics import metrics
+from tripadvisor.parser import get_backend, set_backend
+from tripadvisor.pool import BASE_PORT, PROFILE_DIR
+from tripadvisor.recycle import get_policy, set_policy
+from tripadvisor.scrape_1 import get_categories
+from tripadvisor.scrape_2 import get_activities, get_activities_paged
+from tripadvisor.scrape_3 import Attractie
+from tripadvisor.supervisor import RETRIES, Supervisor
+from tripadvisor.waits import waits
+
+# ruimte laten voor de poorten van een BrowserPool in het hoofdproces
+PORT_OFFSET = 100
+
+
+def split(items: Sequence, shards: int) -> List[list]:
+    """Verdeel items om en om over maximaal shards (niet lege) delen."""
+    parts = [list(items[i::shards]) for i in range(max(1, shards))]
+    return [p for p in parts if p]
+
+
+def _browser(index: int, headless: bool, blocking: str) -> ChromeBrowser:
+    return ChromeBrowser(
+        headless=headless,
+        port=BASE_PORT + PORT_OFFSET + index,
+        profile=f'{PROFILE_DIR}-shard-{index}',
+        blocking=blocking
+    )
+
+
+def shard_settings(waits_file: Optional[str] = None) -> dict:
+    """Instellingen van dit proces die een shard over moet nemen."""
+    return {'parser': get_backend(), 'recycle': get_policy(), 'waits': waits_file}
+
+
+def _start(out_dir: str, stage: str, index: int, settings: Optional[dict]) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    settings = settings or {}
+
+    if settings.get('parser'):
+        set_backend(settings['parser'])
+    if settings.get('recycle') is not None:
+        set_policy(settings['recycle'])
+    if settings.get('waits'):
+        waits.load(settings['waits'])
+
+    # een proces kan na elkaar meerdere shards draaien; alleen de metingen van deze bewaren
+    waits.new.clear()
+
+    # leeg beginnen: run_shards neemt na afloop alles over in de metrics van het hoofdproces
+    metrics.open(_metrics_path(out_dir, stage, index), mode='w')
+    return f'{out_dir}/{stage}-{index}.jsonl'
+
+
+def _stop(out_dir: str, stage: str, index: int):
+    waits.save(_waits_path(out_dir, stage, index), new_only=True)
+    metrics.close()
+
+
+def _metrics_path(out_dir: str, stage: str, index: int) -> str:
+    return f'{out_dir}/metrics-{stage}-{index}.jsonl'
+
+
+def _waits_path(out_dir: str, stage: str, index: int) -> str:
+    return f'{out_dir}/waits-{stage}-{index}.json'
+
+
+def categories_worker(index: int, provincies: List[str], out_dir: str, headless: bool = True,
+                      blocking: str = None, settings: dict = None) -> str:
+    journal = Journal(_start(out_dir, 'categories', index, settings), category_key)
+    browser = _browser(index, headless, blocking)
+
+    try:
+        for provincie in provincies:
+            if journal.done(provincie):
+                continue
+
+            with metrics.timer('stage.categories', provincie):
+                journal.extend(get_categories(browser, [provincie]))
+
+            journal.mark_done(provincie)
+
+    finally:
+        browser.kill()
+        journal.close()
+        _stop(out_dir, 'categories', index)
+
+    return journal.path
+
+
+def activities_worker(index: int, categories: List[tuple], out_dir: str, headless: bool = True,
+                      blocking: str = None, paged: bool = False, settings: dict = None) -> str:
+    journal = Journal(_start(out_dir, 'activities', index, settings), activity_key)
+    browser = _browser(index, headless, blocking)
+
+    try:
+        for cat in categories:
+            if journal.done(cat[1]):
+                continue
+
+            with metrics.timer('stage.activities', cat[1]):
+                if paged:
+                    journal.extend(get_activities_paged(cat, browser))
+                else:
+                    journal.extend(get_activities(cat, browser))
+
+            journal.mark_done(cat[1])
+
+    finally:
+        browser.kill()
+        journal.close()
+        _stop(out_dir, 'activities', index)
+
+    return journal.path
+
+
+def attracties_worker(index: int, links: List[str], out_dir: str, headless: bool = True,
+                      blocking: str = None, engine: str = 'browser', retries: int = RETRIES,
+                      settings: dict = None) -> str:
+    journal = Journal(_start(out_dir, 'attracties', index, settings), attractie_key)
+    dead_letter = Journal(f'{out_dir}/dead_letter-{index}.jsonl', dead_letter_key)
+    browser = _browser(index, headless, blocking)
+    supervisor = Supervisor(dead_letter, retries)
+
+    try:
+        with metrics.timer('stage.attracties'):
+            journal.extend(supervisor.run(
+                lambda link: Attractie(link, headless, browser=browser, blocking=blocking, engine=engine).data,
+                [link for link in links if link not in journal]
+            ))
+
+    finally:
+        browser.kill()
+        journal.close()
+        dead_letter.close()
+        _stop(out_dir, 'attracties', index)
+
+    return journal.path
+
+
+def merge_existing(out_dir: str, stage: str, target: Journal) -> int:
+    """Voeg shard journals van een eerdere (afgebroken) poging samen, voor --resume."""
+    paths = sorted(glob.glob(f'{out_dir}/{stage}-*.jsonl'))
+    return target.merge(paths) if paths else 0
+
+
+def run_shards(worker: Callable[..., str], parts: List[list], out_dir: str, target: Journal, **kwargs) -> int:
+    """
+    Draai worker(index, part, out_dir, **kwargs) voor elk deel in een eigen proces en voeg
+    de shard journals samen in target (ontdubbeld op de sleutel van target).
+
+    Ook als een shard mislukt wordt het werk van alle shards samengevoegd; de fout wordt
+    daarna opgegooid. Metingen en geleerde wachttijden van de shards komen in metrics en
+    waits van dit proces (stap timings niet, die meet de aanroeper zelf). Geeft het aantal
+    samengevoegde records.
+    """
+    if not parts:
+        return 0
+
+    stage = worker.__name__.split('_')[0]
+    paths = [f'{out_dir}/{stage}-{i}.jsonl' for i in range(len(parts))]
+    errors = []
+
+    # spawn: geen fork van een proces met draaiende threads en browser verbindingen
+    with ProcessPoolExecutor(len(parts), mp_context=get_context('spawn')) as executor:
+        futures = [executor.submit(worker, i, part, out_dir, **kwargs) for i, part in enumerate(parts)]
+
+        for i, future in enumerate(futures):
+            try:
+                future.result()
+            except Exception as e_:
+                print(f'shard {i} ({worker.__name__}) mislukt: {e_}')
+                errors.append(e_)
+
+    count = target.merge(p for p in paths if os.path.exists(p))
+
+    for i in range(len(parts)):
+        if os.path.exists(_metrics_path(out_dir, stage, i)):
+            metrics.merge(_metrics_path(out_dir, stage, i), skip=('stage.',))
+        if os.path.exists(_waits_path(out_dir, stage, i)):
+            waits.merge(_waits_path(out_dir, stage, i))
+    print(f'{count} records uit {len(paths)} shards samengevoegd in {target.path}')
+
+    if errors:
+        raise errors[0]
+
+    return count
@@ -0,0 +1,282 @@
+"""
+Kolomgewijze opslag (Parquet) van de scrape stappen.
+
+Elke stap wordt getypeerd en dictionary-encoded weggeschreven, gepartitioneerd op
+scrape datum en provincie:
+
+    <root>/<stap>/scrape_date=2020-10-01/provincie=Noord-Holland/<run>-0.parquet
+
+Bij het inlezen worden alleen de gevraagde kolommen en partities gelezen.
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+from array import array
+from datetime import date
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ROOT = 'results/parquet'
+PARTITIONS = ['scrape_date', 'provincie']
+UNKNOWN = 'onbekend'
+
+CAT_COLUMNS = [
+    'categorie',
+    'cat_url',
+    'added',
+    'status',
+    'provincie'
+]
+
+ACT_COLUMNS = [
+    'titel',
+    'prijs',
+    'attrac_url',
+    'added',
+    'status',
+    'provincie',
+    'cat_url',
+    'listing_reviews'
+]
+
+ATT_COLUMNS = [
+    'status',
+    'titel',
+    'attrac_url',
+    'ta_id',
+    'beoordeling',
+    'adres',
+    'postcode',
+    'plaats',
+    'land',
+    'aantal_reviews',
+    'percentage_excellent',
+    'percentage_verygood',
+    'percentage_average',
+    'percentage_poor',
+    'percentage_terrible',
+    'lat',
+    'lon'
+]
+
+COLUMNS = {
+    'categories': CAT_COLUMNS,
+    'activities': ACT_COLUMNS,
+    'attracties': ATT_COLUMNS,
+}
+
+_PARTITIONING = ds.partitioning(pa.schema([(c, pa.string()) for c in PARTITIONS]), flavor='hive')
+
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+# kolommen die niet in TYPES staan zijn gewone strings
+TYPES = {
+    'categorie': _DICT,
+    'cat_url': _DICT,
+    'status': _DICT,
+    'land': _DICT,
+    'plaats': _DICT,
+    'added': pa.date32(),
+    'prijs': pa.float64(),
+    'listing_reviews': pa.int32(),
+    'ta_id': pa.int64(),
+    'beoordeling': pa.float32(),
+    'aantal_reviews': pa.int32(),
+    'percentage_excellent': pa.int32(),
+    'percentage_verygood': pa.int32(),
+    'percentage_average': pa.int32(),
+    'percentage_poor': pa.int32(),
+    'percentage_terrible': pa.int32(),
+    'lat': pa.float64(),
+    'lon': pa.float64(),
+}
+
+
+_TYPECODES = {
+    pa.int32(): 'i',
+    pa.int64(): 'q',
+    pa.float32(): 'f',
+    pa.float64(): 'd',
+}
+
+
+class ColumnBuilder:
+    """
+    Records van een stap, kolomgewijs in getypeerde buffers.
+
+    Getallen komen in een array (met een null masker), dictionary kolommen als codes met
+    de unieke waarden, overige kolommen als lijst. Per record blijven zo alleen de
+    scalaire waarden over, geen tuple of object per attractie.
+    """
+
+    __slots__ = ('stage', 'columns', 'types', '_buffers', '_valid', '_values', '_length')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.columns = COLUMNS[stage]
+        self.types = [TYPES.get(c, pa.string()) for c in self.columns]
+        self._buffers = []
+        self._valid = [bytearray() for _ in self.columns]
+        self._values = []  # unieke waarden van dictionary kolommen
+        self._length = 0
+
+        for type_ in self.types:
+            if pa.types.is_dictionary(type_):
+                self._buffers.append(array('i'))
+                self._values.append({})
+            else:
+                self._buffers.append(array(_TYPECODES[type_]) if type_ in _TYPECODES else [])
+                self._values.append(None)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, record: tuple):
+        """Voeg een record toe (ontbrekende velden aan het eind worden -1, net als to_frame)."""
+        record = tuple(record) + (-1,) * (len(self.columns) - len(record))
+
+        for value, buffer, valid, values in zip(record, self._buffers, self._valid, self._values):
+            is_valid = value is not None
+
+            if values is not None:
+                buffer.append(values.setdefault(str(value), len(values)) if is_valid else 0)
+
+            elif isinstance(buffer, array):
+                try:
+                    buffer.append(float(value) if buffer.typecode in 'fd' else int(value))
+                except (TypeError, ValueError, OverflowError):
+                    buffer.append(0)
+                    is_valid = False
+
+            else:
+                buffer.append(value)
+
+            valid.append(is_valid)
+
+        self._length += 1
+
+    def extend(self, records: Iterable[tuple]):
+        for record in records:
+            self.append(record)
+
+        return self
+
+    def to_table(self) -> pa.Table:
+        arrays = []
+
+        for type_, buffer, valid, values in zip(self.types, self._buffers, self._valid, self._values):
+            mask = np.frombuffer(bytes(valid), dtype=np.bool_) == 0
+
+            if values is not None:
+                indices = pa.array(np.frombuffer(buffer, dtype=np.int32), type_.index_type, mask=mask)
+                arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(list(values), pa.string())))
+            elif isinstance(buffer, array):
+                arrays.append(pa.array(np.frombuffer(buffer, dtype=buffer.typecode), type_, mask=mask))
+            elif pa.types.is_date(type_):
+                dates = pd.to_datetime(pd.Series(buffer, dtype=object), errors='coerce').dt.date
+                arrays.append(pa.array(dates, type_, mask=mask | dates.isna().to_numpy()))
+            else:
+                arrays.append(pa.array([None if v is None else str(v) for v in buffer], type_))
+
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        return self.to_table().to_pandas()
+
+
+def stage_schema(stage: str) -> pa.Schema:
+    """Schema van een stap, zonder de partitie kolommen."""
+    return pa.schema([(c, TYPES.get(c, pa.string())) for c in COLUMNS[stage] if c not in PARTITIONS])
+
+
+def to_frame(stage: str, records: Iterable[tuple]) -> pd.DataFrame:
+    """Records van een stap als getypeerd dataframe (oudere activities zonder listing_reviews worden aangevuld)."""
+    return ColumnBuilder(stage).extend(records).to_frame()
+
+
+def write_stage(stage: str, data: pd.DataFrame, scrape_date: date, run_id: str,
+                provincies: Dict[str, str] = None, root: str = ROOT) -> int:
+    """
+    Schrijf een stap als parquet dataset.
+
+    provincies:
+        attrac_url -> provincie, voor stappen zonder eigen provincie kolom (attracties)
+
+    run_id:
+        prefix van de bestandsnamen, zodat meerdere runs op dezelfde dag naast elkaar staan
+    """
+    if data.empty:
+        print(f'{stage}: geen data voor parquet')
+        return 0
+
+    if 'provincie' in data.columns:
+        provincie = data['provincie'].fillna(UNKNOWN)
+    else:
+        provincie = data['attrac_url'].map(provincies or {}).fillna(UNKNOWN)
+
+    if 'added' in data.columns:
+        data = data.assign(added=pd.to_datetime(data['added']).dt.date)
+
+    table = pa.Table.from_pandas(
+        data.drop(columns=[c for c in PARTITIONS if c in data.columns]),
+        schema=stage_schema(stage),
+        preserve_index=False
+    )
+    table = table \
+        .append_column('scrape_date', pa.array([scrape_date.isoformat()] * len(table), pa.string())) \
+        .append_column('provincie', pa.array(provincie.astype(str).tolist(), pa.string()))
+
+    pq.write_to_dataset(
+        table,
+        root_path=f'{root}/{stage}',
+        partition_cols=PARTITIONS,
+        basename_template=f'{run_id}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        use_dictionary=True,
+        compression='zstd'
+    )
+
+    print(f'{stage}: {len(table)} rijen naar {root}/{stage}')
+    return len(table)
+
+
+def write_run(categories: Iterable[tuple], activities: Iterable[tuple], attracties: Iterable[tuple],
+              scrape_date: date, run_id: str, root: str = ROOT):
+    """Schrijf alle stappen van een run weg."""
+    df_acts = to_frame('activities', activities)
+    provincies = df_acts.drop_duplicates('attrac_url').set_index('attrac_url')['provincie'].to_dict()
+
+    write_stage('categories', to_frame('categories', categories), scrape_date, run_id, root=root)
+    write_stage('activities', df_acts, scrape_date, run_id, root=root)
+    write_stage('attracties', to_frame('attracties', attracties), scrape_date, run_id,
+                provincies=provincies, root=root)
+
+
+def load_stage(stage: str, columns: List[str] = None, scrape_dates: List[str] = None,
+               provincies: List[str] = None, root: str = ROOT) -> pd.DataFrame:
+    """
+    Lees een stap terug, alleen de gevraagde kolommen en partities.
+
+    scrape_dates:
+        lijst met datums ('YYYY-MM-DD'), None = alle runs
+    """
+    dataset = ds.dataset(f'{root}/{stage}', format='parquet', partitioning=_PARTITIONING)
+
+    flt = None
+    for column, values in (('scrape_date', scrape_dates), ('provincie', provincies)):
+        if values:
+            cond = ds.field(column).isin([str(v) for v in values])
+            flt = cond if flt is None else flt & cond
+
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()
+
+
+def scrape_dates(stage: str = 'attracties', root: str = ROOT) -> List[str]:
+    """Beschikbare scrape datums van een stap."""
+    dataset = ds.dataset(f'{root}/{stage}', format='parquet', partitioning=_PARTITIONING)
+    return sorted(set(dataset.to_table(columns=['scrape_date'])['scrape_date'].to_pylist()))
@@ -0,0 +1,192 @@
+"""
+Werkrij met foutisolatie per item.
+
+Elk item (link) is een losse taak met een beperkt aantal pogingen en exponentiële backoff.
+Items die het ook na de laatste poging niet halen gaan naar een dead letter journal in
+plaats van de hele run af te breken. Een circuit breaker pauzeert het ophalen als het
+percentage fouten plotseling stijgt (blokkade, netwerk weg).
+
+    supervisor = Supervisor(Journal('dead_letter.jsonl', dead_letter_key))
+    attracties.extend(supervisor.run(scrape, links))
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import random
+import time
+import traceback
+from collections import deque
+from threading import Lock
+from typing import Any, Callable, Deque, Iterable, Iterator, Optional
+
+from tripadvisor.journal import Journal
+from tripadvisor.metrics import incr, observe
+
+RETRIES = 3
+BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+
+BREAKER_WINDOW = 50
+BREAKER_THRESHOLD = 0.5
+BREAKER_MIN_CALLS = 10
+BREAKER_COOL_DOWN = 120.0
+
+FAILED = object()
+
+
+class CircuitBreaker:
+    """
+    Pauzeert als de laatste window pogingen voor minstens threshold mislukten.
+
+    Na de pauze (cool_down seconden) bepaalt de eerstvolgende poging of er weer
+    gewoon doorgewerkt wordt of dat er opnieuw gepauzeerd wordt.
+    """
+
+    outcomes: Deque[bool]
+
+    def __init__(self, window: int = BREAKER_WINDOW, threshold: float = BREAKER_THRESHOLD,
+                 min_calls: int = BREAKER_MIN_CALLS, cool_down: float = BREAKER_COOL_DOWN):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.cool_down = cool_down
+        self.outcomes = deque(maxlen=window)
+        self.open_until = 0.0
+        self.half_open = False
+        self._lock = Lock()
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def record(self, ok: bool):
+        with self._lock:
+            self.outcomes.append(ok)
+
+            if self.half_open:
+                self.half_open = False
+                if not ok:
+                    self._open()
+
+            elif len(self.outcomes) >= self.min_calls and self.error_rate >= self.threshold:
+                self._open()
+
+    def _open(self):
+        print(f'circuit breaker open: {self.error_rate:.0%} fouten, {self.cool_down:.0f} s pauze')
+        incr('breaker.open')
+        self.open_until = time.monotonic() + self.cool_down
+        self.outcomes.clear()
+        self.half_open = True
+
+    def wait(self):
+        """Wacht tot de breaker weer dicht is."""
+        remaining = self.open_until - time.monotonic()
+
+        if remaining > 0:
+            observe('breaker.paused', remaining)
+            time.sleep(remaining)
+
+
+class Supervisor:
+    """Voert per item een functie uit met retries, backoff, dead letters en circuit breaker."""
+
+    def __init__(self, dead_letter: Journal = None, retries: int = RETRIES, backoff: float = BACKOFF,
+                 max_backoff: float = MAX_BACKOFF, breaker: CircuitBreaker = None):
+        """
+        dead_letter:
+            journal voor items die na alle pogingen nog mislukken (record: item, fout, pogingen)
+
+        retries:
+            aantal extra pogingen na de eerste
+
+        backoff:
+            wachttijd voor de eerste retry, daarna steeds 2x zo lang (max max_backoff)
+        """
+        self.dead_letter = dead_letter
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.failed = 0
+        self._lock = Lock()
+
+    def delay(self, attempt: int) -> float:
+        """Backoff voor retry nummer attempt (0 = eerste retry), met wat jitter."""
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.75, 1.25)
+
+    def failed_attempt(self, key: Any, e_: Exception, attempt: int) -> Optional[float]:
+        """
+        Leg een mislukte poging vast (attempt 0 = eerste poging).
+
+        Geeft de wachttijd tot de volgende poging, of None als het item opgegeven is
+        (en in de dead letter journal staat).
+        """
+        self.breaker.record(False)
+        incr('supervisor.error', url=str(key))
+        error = f'{e_.__class__.__name__}: {e_}'
+
+        if attempt < self.retries:
+            delay = self.delay(attempt)
+            print(f'fout bij {key} ({error}), opnieuw over {delay:.1f} s')
+            incr('supervisor.retry', url=str(key))
+            return delay
+
+        trace = ''.join(traceback.format_exception(type(e_), e_, e_.__traceback__))
+        self._dead(key, error, attempt + 1, trace)
+        return None
+
+    def call(self, func: Callable, *args, key: Any = None) -> Any:
+        """func(*args) met retries; FAILED als alle pogingen mislukken."""
+        key = args[-1] if key is None and args else key
+
+        for attempt in range(self.retries + 1):
+            self.breaker.wait()
+
+            try:
+                result = func(*args)
+
+            except Exception as e_:
+                delay = self.failed_attempt(key, e_, attempt)
+
+                if delay is None:
+                    return FAILED
+
+                time.sleep(delay)
+                continue
+
+            self.breaker.record(True)
+            return result
+
+    def _dead(self, key: Any, error: str, attempts: int, trace: str):
+        print(f'opgegeven na {attempts} pogingen: {key} ({error})')
+        incr('supervisor.dead_letter', url=str(key))
+
+        with self._lock:
+            self.failed += 1
+            if self.dead_letter is not None:
+                self.dead_letter.append((key, error, attempts, trace))
+
+    def run(self, func: Callable[[Any], Any], items: Iterable) -> Iterator:
+        """Resultaten van func(item), zonder de items die mislukten."""
+        for item in items:
+            result = self.call(func, item)
+
+            if result is not FAILED:
+                yield result
+
+    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """func met retries, voor BrowserPool.map (geeft FAILED bij opgeven)."""
+        def supervised(*args):
+            return self.call(func, *args)
+
+        return supervised
+
+    def map(self, pool, func: Callable[[Any, Any], Any], items: Iterable) -> Iterator:
+        """
+        pool.map(func, items) met retries per item, zonder de items die mislukten.
+
+        Alleen voor pools waarin func zelf de pagina laadt (BrowserPool); een TabPool
+        laadt de pagina vóór func, gebruik daar TabPool.map(func, items, supervisor).
+        """
+        for result in pool.map(self.wrap(func), items):
+            if result is not FAILED:
+                yield result
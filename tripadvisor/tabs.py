@@ -0,0 +1,174 @@
+"""
+Meerdere tabs in één chrome om pagina's parallel te laden.
+
+De navigatie wordt in alle tabs tegelijk gestart; zodra een tab geladen is wordt die
+pagina verwerkt en krijgt de tab de volgende link. Eén chrome proces met N tabs kost
+veel minder geheugen dan N losse browsers (BrowserPool).
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from tripadvisor.browser import ChromeBrowser, Response
+from tripadvisor.metrics import incr, observe
+from tripadvisor.supervisor import Supervisor
+
+TABS = 4
+PAGE_TIME_OUT = 30
+POLL = 0.05
+
+_END = object()
+
+
+class TabPool:
+    """
+    N tabs in één browser, met dezelfde map interface als BrowserPool.
+
+    func(response, item) wordt aangeroepen met de tab van de geladen pagina actief.
+    """
+
+    browser: ChromeBrowser
+    tabs: int
+
+    def __init__(self, browser: ChromeBrowser, tabs: int = TABS, blocking: str = None,
+                 url: Callable[[Any], str] = str, time_out: float = PAGE_TIME_OUT):
+        """
+        url:
+            functie die de url van een item geeft (standaard het item zelf)
+
+        time_out:
+            een tab die na zoveel seconden nog niet geladen is telt als mislukte poging
+        """
+        self.browser = browser
+        self.tabs = max(1, tabs)
+        self.blocking = blocking
+        self.url = url
+        self.time_out = time_out
+
+    def _open(self) -> list:
+        self.browser.set_blocking(self.blocking)
+        return self.browser.open_tabs(self.tabs)
+
+    def map(self, func: Callable[[Response, Any], Any], items: Iterable, supervisor: Supervisor = None) -> Iterator:
+        """
+        Voer func(response, item) uit voor elk item, verdeeld over de tabs.
+
+        Resultaten komen terug in volgorde van laden. Een fout bij het starten, een time-out
+        of een chrome foutpagina telt als mislukte poging, net als een fout in func. Zonder
+        supervisor wordt die fout opnieuw opgegooid. Met supervisor wordt een mislukt item na de backoff opnieuw
+        in een tab geladen (de andere tabs werken intussen door) en na de laatste poging
+        overgeslagen. Bij het bereiken van de recycle drempels worden eerst de lopende tabs
+        afgemaakt, daarna wordt de browser herstart.
+        """
+        driver = self.browser.driver
+        items = iter(items)
+        idle = self._open()
+        busy: Dict[str, Tuple[Any, int, Response, float]] = {}
+        retry: List[Tuple[float, int, Any, int]] = []  # heap van (vanaf, volgnummer, item, poging)
+        queued = itertools.count()
+        exhausted, recycle = False, ''
+
+        def failed(item_, attempt_: int, e_: Exception):
+            """Zonder supervisor de fout opgooien, anders na de backoff opnieuw (of opgeven)."""
+            if supervisor is None:
+                raise e_
+
+            delay = supervisor.failed_attempt(item_, e_, attempt_)
+            if delay is not None:
+                heapq.heappush(retry, (time.monotonic() + delay, next(queued), item_, attempt_ + 1))
+
+        while True:
+            while idle and not recycle:
+                # eerst de lopende tabs afmaken, anders gaan ze verloren bij het herstarten
+                recycle = self.browser.recycle_due()
+                if recycle:
+                    break
+
+                if retry and retry[0][0] <= time.monotonic():
+                    _, _, item, attempt = heapq.heappop(retry)
+                elif not exhausted:
+                    item, attempt = next(items, _END), 0
+
+                    if item is _END:
+                        exhausted = True
+                        continue
+                else:
+                    break
+
+                if supervisor is not None:
+                    supervisor.breaker.wait()
+
+                handle = idle.pop()
+                response = Response(self.url(item), browser=self.browser, blocking=self.blocking)
+
+                try:
+                    driver.switch_to.window(handle)
+                    response.start()
+
+                except Exception as e_:
+                    idle.append(handle)
+                    failed(item, attempt, e_)
+                    continue
+
+                busy[handle] = (item, attempt, response, time.perf_counter())
+
+            if not busy:
+                if exhausted and not retry:
+                    return
+
+                if recycle:
+                    self.browser.recycle_now(recycle)
+                    driver = self.browser.driver
+                    idle, recycle = self._open(), ''
+                else:
+                    time.sleep(POLL)  # alleen nog retries die moeten wachten
+
+                continue
+
+            ready, error = None, None
+            for handle, (item, attempt, response, started) in busy.items():
+                try:
+                    driver.switch_to.window(handle)
+
+                    if self.browser.page_loaded():
+                        ready = handle
+                        break
+
+                except Exception as e_:
+                    ready, error = handle, e_
+                    break
+
+                if time.perf_counter() - started > self.time_out:
+                    incr('tabs.time_out', url=response.link)
+                    ready, error = handle, TimeoutError(f'pagina niet geladen na {self.time_out} s: {response.link}')
+                    break
+
+            if ready is None:
+                time.sleep(POLL)
+                continue
+
+            item, attempt, response, started = busy.pop(ready)
+
+            try:
+                # een half geladen pagina of foutpagina niet verwerken, maar opnieuw proberen
+                if error is not None:
+                    raise error
+
+                observe('tabs.load', time.perf_counter() - started, response.link)
+                result = func(response, item)
+
+            except Exception as e_:
+                failed(item, attempt, e_)
+                continue
+
+            finally:
+                idle.append(ready)
+
+            if supervisor is not None:
+                supervisor.breaker.record(True)
+
+            yield result
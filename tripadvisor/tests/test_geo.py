@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from tripadvisor.geo import CoordinateStore, Gebieden, add_gebieden, spatial_join
+
+# twee overlappende vierkanten: punten in de overlap horen bij het eerste
+GEBIEDEN = Gebieden([box(0, 0, 2, 2), box(1, 1, 3, 3)], ['Amsterdam', 'Almere'])
+
+
+def test_spatial_join():
+    store = CoordinateStore(
+        ['/a', '/b', '/c', '/d', '/e', '/f'],
+        lon=[0.5, 1.5, 2.5, 5.0, -1, np.nan],
+        lat=[0.5, 1.5, 2.5, 5.0, -1, 1.0],
+    )
+
+    assert spatial_join(store, GEBIEDEN).tolist() == ['Amsterdam', 'Amsterdam', 'Almere', None, None, None]
+
+
+def test_first_wins_regardless_of_tree_order():
+    gebieden = Gebieden([box(1, 1, 3, 3), box(0, 0, 2, 2)], ['Almere', 'Amsterdam'])
+    store = CoordinateStore(['/b'], lon=[1.5], lat=[1.5])
+
+    assert spatial_join(store, gebieden).tolist() == ['Almere']
+
+
+def test_valid():
+    store = CoordinateStore(['/a', '/b', '/c'], lon=[4.9, -1, 4.9], lat=[52.4, 52.4, np.nan])
+
+    assert store.valid.tolist() == [True, False, False]
+
+
+def test_no_valid_points():
+    store = CoordinateStore(['/a'], lon=[-1], lat=[-1])
+
+    assert spatial_join(store, GEBIEDEN).tolist() == [None]
+
+
+def test_add_gebieden(tmp_path):
+    path = tmp_path / 'gebieden.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': [{
+        'type': 'Feature',
+        'properties': {'GM_NAAM': 'Amsterdam'},
+        'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]]},
+    }]}), encoding='utf-8')
+
+    df = pd.DataFrame({'attrac_url': ['/a', '/b'], 'lat': ['1.0', '-1'], 'lon': ['1.0', '-1']})
+    df = add_gebieden(df, str(path), 'GM_NAAM')
+
+    assert df['gebied'].iloc[0] == 'Amsterdam'
+    assert pd.isna(df['gebied'].iloc[1])
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from tripadvisor.incremental import PreviousRun, listing_signature, plan
+from tripadvisor.journal import Journal, activity_key, attractie_key
+
+CAT = '/Attractions-g1-Activities-c42.html'
+
+
+def activity(title: str, link: str, reviews: int = 10) -> tuple:
+    return title, 22.5, link, '2026-01-01', 'NEW', 'Noord-Holland', CAT, reviews
+
+
+def attractie(link: str) -> tuple:
+    return 'NEW', 'Molen', link
+
+
+def previous_run(tmp_path, activities, attracties) -> PreviousRun:
+    with Journal(str(tmp_path / 'activities.jsonl'), activity_key) as journal:
+        journal.extend(activities)
+
+    with Journal(str(tmp_path / 'attracties.jsonl'), attractie_key) as journal:
+        for ts, record in attracties:
+            journal.append(record, ts)
+
+    return PreviousRun(str(tmp_path))
+
+
+def test_signature_strips_rank():
+    assert listing_signature(activity('12. Molen', '/a')) == listing_signature(activity('3. Molen', '/a'))
+    assert listing_signature(activity('12. Molen', '/a')) == ['Molen', 10]
+
+
+def test_signature_without_reviews():
+    assert listing_signature(activity('Molen', '/a')[:7]) == ['Molen', -1]
+
+
+def test_plan(tmp_path):
+    recent = (datetime.now() - timedelta(days=5)).isoformat()
+    old = (datetime.now() - timedelta(days=200)).isoformat()
+
+    previous = previous_run(
+        tmp_path,
+        [activity('1. Molen', '/a'), activity('Museum', '/b'), activity('Tour', '/c')],
+        [(recent, attractie('/a')), (recent, attractie('/b')), (old, attractie('/c'))],
+    )
+
+    todo, carried = plan([
+        activity('4. Molen', '/a'),           # alleen de rang veranderd: overnemen
+        activity('Museum', '/b', reviews=11),  # een review erbij: gewijzigd
+        activity('Tour', '/c'),                # ouder dan max_age: verouderd
+        activity('Nieuw', '/d'),               # nieuw
+        activity('4. Molen', '/a'),            # dubbel
+    ], previous, max_age_days=90)
+
+    assert todo == ['/b', '/c', '/d']
+    # het overgenomen record houdt zijn oorspronkelijke tijdstip
+    assert carried == [(recent, attractie('/a'))]
+
+
+def test_carried_ts_kept_in_journal(tmp_path):
+    ts = (datetime.now() - timedelta(days=5)).isoformat()
+    (tmp_path / 'vorige').mkdir()
+    previous = previous_run(tmp_path / 'vorige', [activity('Molen', '/a')], [(ts, attractie('/a'))])
+
+    _, carried = plan([activity('Molen', '/a')], previous)
+
+    with Journal(str(tmp_path / 'attracties.jsonl'), attractie_key) as journal:
+        for ts_, record in carried:
+            journal.append(record, ts_)
+
+    assert [e['ts'] for e in Journal(str(tmp_path / 'attracties.jsonl'), attractie_key).entries()] == [ts]
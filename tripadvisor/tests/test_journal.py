@@ -0,0 +1,56 @@
+from tripadvisor.journal import Journal, attractie_key, category_key
+
+
+def test_append_and_reload(tmp_path):
+    path = str(tmp_path / 'attracties.jsonl')
+
+    with Journal(path, attractie_key) as journal:
+        journal.append(('NEW', 'A', '/a'))
+        journal.append(('NEW', 'B', '/b'))
+        journal.append(('NEW', 'A2', '/a'))
+
+    journal = Journal(path, attractie_key)
+    assert '/a' in journal and '/c' not in journal
+    assert len(journal) == 2
+    # dubbelen: het eerste record blijft
+    assert list(journal) == [('NEW', 'A', '/a'), ('NEW', 'B', '/b')]
+
+
+def test_done(tmp_path):
+    path = str(tmp_path / 'categories.jsonl')
+
+    with Journal(path, category_key) as journal:
+        journal.append(('Tours', '/tours'))
+        journal.mark_done('/tours')
+
+    journal = Journal(path, category_key)
+    assert journal.done('/tours')
+    assert not journal.done('/musea')
+    assert len(journal) == 1
+
+
+def test_truncated_last_line(tmp_path):
+    path = tmp_path / 'attracties.jsonl'
+    path.write_text('{"key": "/a", "ts": "x", "data": ["NEW", "A", "/a"]}\n{"key": "/b", "ts"', encoding='utf-8')
+
+    with Journal(str(path), attractie_key) as journal:
+        assert list(journal) == [('NEW', 'A', '/a')]
+        journal.append(('NEW', 'C', '/c'))
+
+    assert list(Journal(str(path), attractie_key)) == [('NEW', 'A', '/a'), ('NEW', 'C', '/c')]
+
+
+def test_merge(tmp_path):
+    shards = []
+    for i, records in enumerate(([('NEW', 'A', '/a'), ('NEW', 'B', '/b')], [('NEW', 'B2', '/b')])):
+        with Journal(str(tmp_path / f'attracties-{i}.jsonl'), attractie_key) as shard:
+            shard.extend(records)
+            shard.mark_done(f'deel-{i}')
+        shards.append(shard.path)
+
+    with Journal(str(tmp_path / 'attracties.jsonl'), attractie_key) as target:
+        target.append(('NEW', 'A0', '/a'))
+
+        assert target.merge(shards) == 1
+        assert list(target) == [('NEW', 'A0', '/a'), ('NEW', 'B', '/b')]
+        assert target.done('deel-0') and target.done('deel-1')
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from tripadvisor.parser import BACKENDS, parse
+from tripadvisor.scrape_2 import find_price, get_links
+
+CARD = 'attractions-ap-product-card-ProductCard__productCard'
+PRICE = 'attractions-ap-product-card-Attributes__priceFrom--2jhVp'
+
+LISTING = f"""
+<html><body>
+  <div class="{CARD}--3Xv9Z extra">
+    <a href="/Attraction_Review-g1-d1-Reviews-Foto.html"><img></a>
+    <a href="/Attraction_Review-g1-d1-Reviews-Molen.html">1. Molen</a>
+    <span>1,234 reviews</span>
+    <div class="{PRICE}">vanaf €22,50</div>
+  </div>
+  <div class="attraction_element">
+    <a onclick="ta.go('/Attraction_Review-g1-d2-Reviews-Museum.html')">Museum</a>
+  </div>
+  <div class="attractions-ap-product-card-Other"><a href="/Attraction_Review-g1-d3-Reviews-X.html">Geen kaart</a></div>
+</body></html>
+"""
+
+SCRIPTS = """
+<html><head>
+  <script type="application/ld+json">{"@type": "LocalBusiness", "name": "Molen"}</script>
+  <script type="text/javascript"></script>
+</head><body><span class="rev"> 1,234 </span></body></html>
+"""
+
+
+def both(html: str, func):
+    """func(document) voor elke backend."""
+    return [func(parse(html, backend)) for backend in BACKENDS]
+
+
+def test_find_price_set_attrs():
+    bs4_price, lxml_price = both(LISTING, lambda doc: [find_price(card) for card in doc.find_all('div', {'class': 'extra'})])
+
+    assert bs4_price == lxml_price == [22.5]
+
+
+def test_get_links_regex_and_string_class():
+    bs4_links, lxml_links = both(LISTING, lambda doc: get_links(doc, '/Attractions-g1-Activities.html', 'Noord-Holland'))
+
+    assert bs4_links == lxml_links
+    assert [(a[0], a[2], a[5], a[7]) for a in bs4_links] == [
+        ('1. Molen', '/Attraction_Review-g1-d1-Reviews-Foto.html', 'Noord-Holland', 1234),
+        ('Museum', '/Attraction_Review-g1-d2-Reviews-Museum.html', 'Noord-Holland', -1),
+    ]
+
+
+@pytest.mark.parametrize('attrs, expected', [
+    ({'type': 'application/ld+json'}, {'@type': 'LocalBusiness', 'name': 'Molen'}),
+    ({'type': 'text/javascript'}, None),
+])
+def test_script_string(attrs, expected):
+    strings = both(SCRIPTS, lambda doc: doc.find('script', attrs).string)
+
+    assert strings[0] == strings[1]
+    assert (json.loads(strings[0]) if strings[0] else None) == expected
+
+
+def test_span_string():
+    assert both(SCRIPTS, lambda doc: doc.find('span', {'class': 'rev'}).string) == [' 1,234 '] * 2
@@ -0,0 +1,48 @@
+import struct
+from datetime import date
+from decimal import Decimal
+
+from tripadvisor.psql import BINARY_ENCODERS, _encode_numeric, binary_chunks
+
+
+def numeric(ndigits, weight, sign, dscale, *digits):
+    return struct.pack(f'!hhHH{len(digits)}H', ndigits, weight, sign, dscale, *digits)
+
+
+def test_encode_numeric():
+    assert _encode_numeric(Decimal('12345.678')) == numeric(3, 1, 0, 3, 1, 2345, 6780)
+    assert _encode_numeric('-0.0001') == numeric(1, -1, 0x4000, 4, 1)
+    assert _encode_numeric(10000) == numeric(1, 1, 0, 0, 1)
+    assert _encode_numeric(0) == numeric(0, 0, 0, 0)
+    assert _encode_numeric(4.5) == numeric(2, 0, 0, 1, 4, 5000)
+
+
+def test_encode_numeric_special_values():
+    assert _encode_numeric(float('nan')) == numeric(0, 0, 0xC000, 0)
+    assert _encode_numeric(float('inf')) == numeric(0, 0, 0xD000, 0)
+    assert _encode_numeric(Decimal('-Infinity')) == numeric(0, 0, 0xF000, 0)
+
+
+def test_binary_chunks():
+    encoders = [BINARY_ENCODERS['int4'], BINARY_ENCODERS['text'], BINARY_ENCODERS['date']]
+    rows = [(1, 'één', date(2000, 1, 2)), (2, None, float('nan'))]
+
+    data = b''.join(binary_chunks(rows, encoders, chunk_rows=1))
+
+    header = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+    assert data.startswith(header)
+    assert data.endswith(struct.pack('!h', -1))
+
+    text = 'één'.encode('utf-8')
+    row_1 = (struct.pack('!h', 3) + struct.pack('!ii', 4, 1) + struct.pack('!i', len(text)) + text
+             + struct.pack('!ii', 4, 1))
+    row_2 = struct.pack('!h', 3) + struct.pack('!ii', 4, 2) + struct.pack('!ii', -1, -1)
+    assert data[len(header):-2] == row_1 + row_2
+
+
+def test_binary_chunks_per_block():
+    chunks = list(binary_chunks(((i,) for i in range(5)), [BINARY_ENCODERS['int8']], chunk_rows=2))
+
+    # 2 + 2 + 1 rijen, de laatste met de trailer
+    assert len(chunks) == 3
+    assert chunks[-1].endswith(struct.pack('!h', -1))
@@ -0,0 +1,41 @@
+from tripadvisor.parser import parse
+from tripadvisor.scrape_2 import find_page_offsets, offset_url
+
+LINK = '/Attractions-g188590-Activities-c42-Amsterdam_North_Holland_Province.html'
+
+
+def test_offset_url():
+    assert offset_url(LINK, 30) == '/Attractions-g188590-Activities-c42-oa30-Amsterdam_North_Holland_Province.html'
+    assert offset_url(LINK, 0) == LINK
+
+
+def test_offset_url_replaces_existing_offset():
+    paged = offset_url(LINK, 30)
+
+    assert offset_url(paged, 60) == offset_url(LINK, 60)
+    assert offset_url(paged, 0) == LINK
+
+
+def test_offset_url_with_type():
+    link = '/Attractions-g188590-Activities-c47-t163-Amsterdam.html'
+    assert offset_url(link, 90) == '/Attractions-g188590-Activities-c47-t163-oa90-Amsterdam.html'
+
+
+def test_find_page_offsets_from_pagination():
+    soup = parse(
+        '<div>'
+        '<a data-page-number="2" data-offset="30">2</a>'
+        '<a data-page-number="3" data-offset="60">3</a>'
+        '<a data-page-number="5" data-offset="120">5</a>'
+        '</div>'
+    )
+    assert find_page_offsets(soup) == [30, 60, 90, 120]
+
+
+def test_find_page_offsets_from_total():
+    soup = parse('<div><span>1-30 of 95 results</span></div>')
+    assert find_page_offsets(soup) == [30, 60, 90]
+
+
+def test_find_page_offsets_single_page():
+    assert find_page_offsets(parse('<div><span>Niets</span></div>')) == []
@@ -0,0 +1,44 @@
+import pyarrow as pa
+
+from tripadvisor.store import ACT_COLUMNS, ColumnBuilder, TYPES
+
+ACTIVITY = ('Rijksmuseum', 22.5, '/a', '2021-03-01', 'NEW', 'Noord-Holland', '/c', 1234)
+
+
+def test_column_builder():
+    builder = ColumnBuilder('activities').extend([
+        ACTIVITY,
+        ('Artis', None, '/b', None, 'NEW', 'Noord-Holland', '/c', 'onbekend'),
+    ])
+    table = builder.to_table()
+
+    assert len(builder) == 2
+    assert table.column_names == ACT_COLUMNS
+    assert table.column('titel').to_pylist() == ['Rijksmuseum', 'Artis']
+    # alleen None is leeg; een getal dat niet te lezen is ook
+    assert table.column('prijs').to_pylist() == [22.5, None]
+    assert table.column('added').to_pylist()[1] is None
+    assert table.column('listing_reviews').to_pylist() == [1234, None]
+
+
+def test_column_builder_types():
+    table = ColumnBuilder('activities').extend([ACTIVITY]).to_table()
+
+    for name in ACT_COLUMNS:
+        assert table.schema.field(name).type == TYPES.get(name, pa.string())
+
+
+def test_column_builder_pads_old_records():
+    # activities van voor listing_reviews missen het laatste veld
+    frame = ColumnBuilder('activities').extend([ACTIVITY[:-1]]).to_frame()
+    assert frame['listing_reviews'].tolist() == [-1]
+
+
+def test_column_builder_dictionary_codes():
+    table = ColumnBuilder('activities').extend([ACTIVITY, ACTIVITY, ACTIVITY[:5] + ('Flevoland',) + ACTIVITY[6:]]) \
+        .to_table()
+    provincie = table.column('provincie')
+
+    if pa.types.is_dictionary(provincie.type):
+        assert provincie.chunk(0).dictionary.to_pylist() == ['Noord-Holland', 'Flevoland']
+    assert provincie.to_pylist() == ['Noord-Holland', 'Noord-Holland', 'Flevoland']
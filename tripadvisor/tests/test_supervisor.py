@@ -0,0 +1,58 @@
+from tripadvisor.supervisor import CircuitBreaker, FAILED, Supervisor
+
+
+def test_breaker_opens_at_threshold():
+    breaker = CircuitBreaker(window=10, threshold=0.5, min_calls=4, cool_down=60)
+
+    for ok in (True, False, True):
+        breaker.record(ok)
+    assert breaker.open_until == 0.0
+
+    breaker.record(False)
+    assert breaker.open_until > 0.0
+    assert breaker.half_open
+
+
+def test_breaker_half_open():
+    breaker = CircuitBreaker(window=10, threshold=0.5, min_calls=2, cool_down=0)
+    breaker.record(False)
+    breaker.record(False)
+    opened = breaker.open_until
+
+    # de eerste poging na de pauze lukt: weer dicht
+    breaker.record(True)
+    assert not breaker.half_open
+    assert breaker.open_until == opened
+
+    # 1 fout op 3 pogingen blijft onder de drempel
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.open_until == opened
+
+
+def test_breaker_reopens_after_failed_probe():
+    breaker = CircuitBreaker(window=10, threshold=0.5, min_calls=2, cool_down=0)
+    breaker.record(False)
+    breaker.record(False)
+    opened = breaker.open_until
+
+    breaker.record(False)
+    assert breaker.half_open
+    assert breaker.open_until >= opened
+
+
+def test_supervisor_retries_and_dead_letters():
+    calls = {}
+
+    def flaky(item):
+        calls[item] = calls.get(item, 0) + 1
+        if item == 'kapot' or calls[item] < 2:
+            raise ValueError(item)
+        return item.upper()
+
+    supervisor = Supervisor(retries=2, backoff=0, breaker=CircuitBreaker(min_calls=100))
+
+    assert list(supervisor.run(flaky, ['a', 'kapot', 'b'])) == ['A', 'B']
+    assert calls == {'a': 2, 'kapot': 3, 'b': 2}
+    assert supervisor.failed == 1
+    assert supervisor.call(flaky, 'kapot') is FAILED
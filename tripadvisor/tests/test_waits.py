@@ -0,0 +1,57 @@
+from tripadvisor.waits import MIN_TIME_OUT, WaitBudget
+
+
+def learn(budget, seconds, n, default=2.0):
+    for _ in range(n):
+        budget.record('listing', 'next', seconds, budget.time_out('listing', 'next', default))
+
+
+def test_default_until_min_samples():
+    budget = WaitBudget(min_samples=5)
+    learn(budget, 0.01, 4)
+
+    assert budget.time_out('listing', 'next', 2.0) == 2.0
+
+
+def test_fast_hits_shrink_time_out():
+    budget = WaitBudget(min_samples=5)
+    learn(budget, 0.001, 5)
+
+    assert budget.time_out('listing', 'next', 2.0) < 2 * MIN_TIME_OUT
+
+
+def test_misses_widen_time_out_again():
+    budget = WaitBudget(min_samples=5, max_misses=1000)
+    learn(budget, 0.01, 20)
+    short = budget.time_out('listing', 'next', 2.0)
+
+    # de pagina wordt trager: het element verschijnt pas na 0.5 s
+    found = 0
+    for _ in range(100):
+        time_out = budget.time_out('listing', 'next', 2.0)
+        seconds = 0.5 if time_out >= 0.5 else None
+        budget.record('listing', 'next', seconds, time_out)
+        found += seconds is not None
+
+    assert short < 0.5
+    assert budget.time_out('listing', 'next', 2.0) >= 0.5
+    assert found > 50
+
+
+def test_misses_capped_at_default():
+    budget = WaitBudget(min_samples=5, max_misses=1000)
+    learn(budget, None, 200, default=1.0)
+
+    assert budget.time_out('listing', 'next', 1.0) <= 1.0 * (1 + budget.margin) + 0.05
+
+
+def test_fail_fast_after_max_misses():
+    budget = WaitBudget(min_samples=5, max_misses=3)
+    learn(budget, None, 3)
+
+    assert budget.time_out('listing', 'next', 2.0) == 0.0
+
+    # een directe controle telt niet als meting
+    before = len(budget.stats[('listing', 'next')].found)
+    budget.record('listing', 'next', None, 0.0)
+    assert len(budget.stats[('listing', 'next')].found) == before
@@ -0,0 +1,246 @@
+"""
+Adaptieve wachttijden voor Selenium waits.
+
+Per (pagina type, naam) wordt bijgehouden hoe lang een wait echt duurde. Na MIN_SAMPLES
+metingen wordt de time-out p95 * (1 + margin) + MARGIN_S, binnen [MIN_TIME_OUT, MAX_TIME_OUT].
+Een time-out telt mee als meting van (minstens) de gebruikte time-out, maximaal de standaard
+time-out: wordt een pagina trager dan geleerd, dan groeit de time-out weer in plaats van
+voorgoed op MIN_TIME_OUT te blijven staan.
+Een element dat MAX_MISSES keer achter elkaar niet verscheen wordt alleen nog direct
+gecontroleerd (fail fast), met af en toe een poging met de standaard time-out.
+
+Tijd verloren aan time-outs en vaste sleeps wordt per wait bijgehouden (report()).
+Metingen uit andere processen (shards) komen erbij met save(path, new_only=True) en merge(path).
+
+    wait = waits.plan('attractie', {'staticmap': XPATH_MAP}, default=2)
+    response.get_response(wait_for_elements=wait)
+    waits.record_all('attractie', {'staticmap': XPATH_MAP}, wait, response.waited)
+
+@author: Roel de Vries
+@email: roel.de.vries@amsterdam.nl
+"""
+import json
+import time
+from collections import deque
+from threading import Lock
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from tripadvisor.metrics import incr, observe
+
+WINDOW = 200
+MIN_SAMPLES = 20
+MARGIN = 0.25
+MARGIN_S = 0.05
+MIN_TIME_OUT = 0.05
+MAX_TIME_OUT = 10.0
+MAX_MISSES = 20
+PROBE_EVERY = 50
+POLL = 0.05
+
+Key = Tuple[str, str]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class WaitStats:
+    """Metingen van één wait."""
+
+    def __init__(self):
+        self.found: Deque[float] = deque(maxlen=WINDOW)
+        self.waits = 0
+        self.misses = 0
+        self.consecutive_misses = 0
+        self.lost_time_out = 0.0
+        self.lost_sleep = 0.0
+        self.default: Optional[float] = None  # standaard time-out van de laatste time_out()
+
+    def to_dict(self) -> dict:
+        return {
+            'found': list(self.found), 'waits': self.waits, 'misses': self.misses,
+            'consecutive_misses': self.consecutive_misses,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        stats = cls()
+        stats.found.extend(data.get('found', []))
+        stats.waits = data.get('waits', 0)
+        stats.misses = data.get('misses', 0)
+        stats.consecutive_misses = data.get('consecutive_misses', 0)
+        return stats
+
+
+class WaitBudget:
+    """Leert per (pagina type, naam) welke time-out nodig is, thread-safe."""
+
+    stats: Dict[Key, WaitStats]
+    new: Dict[Key, WaitStats]
+
+    def __init__(self, margin: float = MARGIN, min_samples: int = MIN_SAMPLES, max_misses: int = MAX_MISSES):
+        self.margin = margin
+        self.min_samples = min_samples
+        self.max_misses = max_misses
+        self.stats = {}
+        self.new = {}  # alleen de metingen van dit proces, niet wat er met load() bij kwam
+        self._lock = Lock()
+
+    def _stats(self, page_type: str, name: str) -> WaitStats:
+        return self.stats.setdefault((page_type, name), WaitStats())
+
+    def _new(self, page_type: str, name: str) -> WaitStats:
+        return self.new.setdefault((page_type, name), WaitStats())
+
+    def time_out(self, page_type: str, name: str, default: float) -> float:
+        """Time-out in seconden voor de volgende wait."""
+        with self._lock:
+            stats = self._stats(page_type, name)
+            stats.waits += 1
+            stats.default = default
+            self._new(page_type, name).waits += 1
+
+            # element verschijnt nooit: alleen direct controleren, af en toe opnieuw proberen
+            if stats.consecutive_misses >= self.max_misses and stats.waits % PROBE_EVERY:
+                return 0.0
+
+            if len(stats.found) < self.min_samples:
+                return default
+
+            learned = _percentile(list(stats.found), 95) * (1 + self.margin) + MARGIN_S
+            return min(MAX_TIME_OUT, max(MIN_TIME_OUT, learned))
+
+    def record(self, page_type: str, name: str, seconds: Optional[float], time_out: float):
+        """
+        Leg een wait vast: seconds tot het element er was, of None bij een time-out.
+
+        Een time-out is een gecensureerde meting: het element had minstens time_out nodig.
+        Die wordt als meting bewaard (hooguit de standaard time-out, zodat een element dat
+        soms echt ontbreekt de time-out niet tot MAX_TIME_OUT opdrijft). Een directe controle
+        (time_out 0) zegt niets over de laadtijd en telt niet mee.
+        """
+        with self._lock:
+            default = self._stats(page_type, name).default
+            censored = min(time_out, default) if default is not None else time_out
+
+            for stats in (self._stats(page_type, name), self._new(page_type, name)):
+                if seconds is None:
+                    stats.misses += 1
+                    stats.consecutive_misses += 1
+                    stats.lost_time_out += time_out
+
+                    if censored > 0:
+                        stats.found.append(censored)
+                else:
+                    stats.found.append(seconds)
+                    stats.consecutive_misses = 0
+
+        if seconds is None:
+            incr(f'wait.{page_type}.{name}.timeout')
+            observe('wait.lost.time_out', time_out)
+        else:
+            observe(f'wait.{page_type}.{name}', seconds)
+
+    def plan(self, page_type: str, named: Dict[str, str], default: float) -> List[Tuple[str, float]]:
+        """[(xpath, time-out)] voor wait_until_ready, voor {naam: xpath}."""
+        return [(xpath, self.time_out(page_type, name, default)) for name, xpath in named.items()]
+
+    def record_all(self, page_type: str, named: Dict[str, str], planned: List[Tuple[str, float]],
+                   found: Dict[str, Optional[float]]):
+        """Leg de uitkomst van wait_until_ready vast (found leeg = wait mislukt, niets leren)."""
+        if not found:
+            return
+
+        time_outs = dict(planned)
+        for name, xpath in named.items():
+            if xpath in found:
+                self.record(page_type, name, found[xpath], time_outs.get(xpath, 0.0))
+
+    def until(self, driver, page_type: str, name: str, condition: Callable, default: float) -> bool:
+        """WebDriverWait met een geleerde time-out; False bij een time-out."""
+        time_out = self.time_out(page_type, name, default)
+        start = time.perf_counter()
+
+        try:
+            WebDriverWait(driver, time_out, poll_frequency=POLL).until(condition)
+
+        except TimeoutException:
+            self.record(page_type, name, None, time_out)
+            return False
+
+        self.record(page_type, name, time.perf_counter() - start, time_out)
+        return True
+
+    def sleep(self, page_type: str, name: str, seconds: float):
+        """Vaste sleep, geteld als verloren tijd."""
+        time.sleep(seconds)
+
+        with self._lock:
+            self._stats(page_type, name).lost_sleep += seconds
+
+        observe('wait.lost.sleep', seconds)
+
+    def report(self) -> str:
+        """Tabel met per wait aantal, time-outs, p95 en verloren tijd (time-outs + sleeps)."""
+        with self._lock:
+            items = sorted(self.stats.items())
+
+        lines = [f"{'wait':<36}{'aantal':>8}{'time-outs':>10}{'p95 ms':>10}{'verloren s':>12}"]
+
+        for (page_type, name), stats in items:
+            p95 = _percentile(list(stats.found), 95) * 1000 if stats.found else 0.0
+            lost = stats.lost_time_out + stats.lost_sleep
+            lines.append(f'{page_type + "." + name:<36}{stats.waits:>8}{stats.misses:>10}{p95:>10.1f}{lost:>12.1f}')
+
+        return '\n'.join(lines)
+
+    def print_report(self):
+        print('\n' + self.report() + '\n')
+
+    def save(self, path: str, new_only: bool = False):
+        """
+        Bewaar de metingen, zodat een volgende run niet opnieuw hoeft te leren.
+
+        new_only:
+            alleen de metingen van dit proces (voor merge() in het hoofdproces)
+        """
+        with self._lock:
+            data = {f'{k[0]}|{k[1]}': v.to_dict() for k, v in (self.new if new_only else self.stats).items()}
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def load(self, path: str):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+
+        with self._lock:
+            for key, value in data.items():
+                page_type, name = key.split('|', 1)
+                self.stats[(page_type, name)] = WaitStats.from_dict(value)
+
+        return self
+
+    def merge(self, path: str):
+        """Voeg metingen toe die een ander proces met save(path, new_only=True) bewaarde."""
+        other = WaitBudget().load(path)
+
+        with self._lock:
+            for (page_type, name), theirs in other.stats.items():
+                for stats in (self._stats(page_type, name), self._new(page_type, name)):
+                    stats.found.extend(theirs.found)
+                    stats.waits += theirs.waits
+                    stats.misses += theirs.misses
+                    stats.consecutive_misses = theirs.consecutive_misses
+
+        return self
+
+
+waits = WaitBudget()